@@ -20,99 +20,550 @@
 # Requests is apache 2.0 licenced
 import requests
 # PyQt is GPL v3
-from PyQt5.QtCore import QThread, pyqtSignal, QObject, QTimer, pyqtSlot
-from PyQt5.QtGui import QImage, QPixmap, QColor
+from PyQt5.QtCore import QThread, Qt, pyqtSignal, QObject, QTimer, pyqtSlot
 # Python standard library is PSF licenced
-from http.server import BaseHTTPRequestHandler, HTTPServer
 from uuid import uuid4
+import asyncio
 import base64
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from enum import Enum
-from time import sleep
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from random import uniform
+from time import monotonic, time
 import urllib.parse as urlparse
 import webbrowser
+# Other files from this project, GPL v3 licenced
+from FileUtils import atomic_write
+from HttpSession import PooledSession
+
+
+# How many seconds the server said it will keep serving the same cached response for, from the Cache-Control max-age
+# or failing that the Expires header (compared against the server's Date header so our own clock doesn't matter).
+# None if the server didn't say
+def seconds_until_expiry(response):
+    for directive in response.headers.get('Cache-Control', '').split(','):
+        name, _, value = directive.strip().partition('=')
+        if name.lower() == 'max-age':
+            try:
+                return max(int(value) - int(response.headers.get('Age', 0)), 0)
+            except ValueError:
+                break
+
+    expires = response.headers.get('Expires')
+    if expires is not None:
+        try:
+            date = response.headers.get('Date')
+            now = parsedate_to_datetime(date) if date is not None else datetime.now(timezone.utc)
+            return max((parsedate_to_datetime(expires) - now).total_seconds(), 0)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+# Returned by a location poll in place of the position when the character's tokens were turned down
+_CREDENTIALS_REJECTED = object()
+
+
+# True if the request failed because the server won't accept our tokens or code (for instance a refresh token that has
+# been revoked or has expired), which asking again won't fix
+def credentials_rejected(error):
+    return (isinstance(error, requests.exceptions.HTTPError) and error.response is not None and
+            error.response.status_code in (400, 401, 403))
+
 
+# Start and end of a png (its signature, then the empty IEND chunk it finishes with) and of a jpeg (start and end of image
+# markers)
+_PNG_START = b'\x89PNG\r\n\x1a\n'
+_PNG_END = b'\x00\x00\x00\x00IEND\xaeB`\x82'
+_JPEG_START = b'\xff\xd8'
+_JPEG_END = b'\xff\xd9'
 
-class StoppableHTTPServer(HTTPServer):
+
+# Whether data is a whole png or jpeg, judged by how it starts and ends, so a download that was cut short (or a file
+# that has been damaged since) is caught without decoding the image
+def is_complete_image(data):
+    if data.startswith(_PNG_START):
+        return data.endswith(_PNG_END)
+    if data.startswith(_JPEG_START):
+        return data.rstrip(b'\x00\r\n ').endswith(_JPEG_END)
+    return False
+
+
+class PortraitCache(object):
     """
-    The base HTTPServer class is not designed to be stop and start on demand. This subclass adds that functionality
+    Character portraits saved to disk with the ETag / Last-Modified they were served with, so that on the next launch
+    they can be revalidated with a conditional request rather than downloaded again. Images are checked to be whole
+    before they're used or saved, and a damaged one is downloaded again rather than revalidated. With no directory
+    given, portraits are always downloaded.
     """
-    stopped = False
 
-    def __init__(self, *args):
-        self.stopped = False
-        super(StoppableHTTPServer, self).__init__(*args)
+    def __init__(self, directory=None):
+        self.directory = directory
+
+    def _paths(self, character_id, size):
+        base_path = os.path.join(self.directory, '{}_{}'.format(character_id, size))
+        return base_path + '.img', base_path + '.json'
 
-    def serve_forever(self):
-        while not self.stopped:
-            self.handle_request()
+    def fetch(self, session, url, character_id, size):
+        if self.directory is None:
+            response = session.get(url)
+            response.raise_for_status()
+            return response.content
+
+        image_path, validators_path = self._paths(character_id, size)
+        data = None
+        headers = {}
+        try:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+            with open(validators_path) as f:
+                validators = json.load(f)
+        except (OSError, ValueError):
+            # Nothing cached yet (or the cache is corrupt), so just download it
+            data = None
+        if data is not None and not is_complete_image(data):
+            # The server would keep telling us it hasn't changed, so it's downloaded again without the validators
+            print('The cached character portrait is damaged, downloading it again')
+            data = None
+        if data is not None and isinstance(validators, dict) and validators.get('url') == url:
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        response = session.get(url, headers=headers)
+        if response.status_code == 304 and data is not None:
+            return data
+        response.raise_for_status()
+
+        if not is_complete_image(response.content):
+            print('The character portrait downloaded is damaged, not caching it')
+            self._forget(image_path, validators_path)
+            return response.content
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # The image goes first, so the validators never describe an image we haven't got
+            atomic_write(image_path, response.content, 'wb')
+            atomic_write(validators_path, json.dumps({'url': url,
+                                                      'etag': response.headers.get('ETag'),
+                                                      'last_modified': response.headers.get('Last-Modified')}))
+        except OSError as e:
+            print(e)
+            print('Unable to save the character portrait to the cache')
+        return response.content
 
-    def force_stop(self):
-        self.server_close()
-        self.stopped = True
+    @staticmethod
+    def _forget(*paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
 
 
-class HttpServerThread(QThread):
+class EndpointCache(object):
     """
-    Helper thread to run the http server
+    Endpoint urls found on previous runs, saved to disk so the next launch can start polling the location straight away
+    instead of first walking the api root -> decode -> character -> location chain. Entries older than max_age seconds
+    are ignored, and dropped whenever the cache is loaded or saved. Characters are stored under their character url,
+    which never changes, along with an index from a hash of their refresh token to that url, as the refresh token is all
+    we know about a character at startup. The SSO can hand out a new refresh token when the old one is used, so only
+    the latest token of each character is kept in the index.
     """
 
-    def __init__(self, port):
-        super(HttpServerThread, self).__init__()
-        self.port = port
-        self.server = None
+    def __init__(self, path=None, max_age=24 * 60 * 60):
+        self.path = path
+        self.max_age = max_age
+        self._data = {'public': None, 'characters': {}, 'tokens': {}}
+        if self.path is not None:
+            self.load()
+
+    @staticmethod
+    def _token_key(refresh_token):
+        return sha256(refresh_token.encode('utf-8')).hexdigest()
+
+    def _is_fresh(self, entry):
+        return entry is not None and time() - entry['time'] <= self.max_age
+
+    def get_public(self):
+        entry = self._data['public']
+        return dict(entry['endPoints']) if self._is_fresh(entry) else None
+
+    def set_public(self, end_points):
+        self._data['public'] = {'time': time(), 'endPoints': dict(end_points)}
+        self.save()
+
+    # Returns {'char': url, 'location': url, 'name': name} for the character, or None if we don't have recent ones
+    def get_character(self, refresh_token):
+        entry = self._data['characters'].get(self._data['tokens'].get(self._token_key(refresh_token)))
+        return entry if self._is_fresh(entry) else None
+
+    def set_character(self, refresh_token, char, location, name):
+        self._data['characters'][char] = {'time': time(), 'char': char, 'location': location, 'name': name}
+        tokens = self._data['tokens']
+        for key in [key for key, token_char in tokens.items() if token_char == char]:
+            del tokens[key]
+        tokens[self._token_key(refresh_token)] = char
+        self.save()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self._data['public'] = data.get('public')
+            # Caches from before the token index were keyed on the token, those characters are just discovered again
+            if 'tokens' in data:
+                self._data['characters'] = data['characters']
+                self._data['tokens'] = data['tokens']
+            self._prune()
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            # Missing or corrupt cache, we'll just discover everything again
+            self._data = {'public': None, 'characters': {}, 'tokens': {}}
+
+    # Forgets characters we haven't seen for max_age, and any tokens that lead to them
+    def _prune(self):
+        if self._data['public'] is not None and not self._is_fresh(self._data['public']):
+            self._data['public'] = None
+        characters = {char: entry for char, entry in self._data['characters'].items() if self._is_fresh(entry)}
+        self._data['characters'] = characters
+        self._data['tokens'] = {key: char for key, char in self._data['tokens'].items() if char in characters}
+
+    def save(self):
+        if self.path is None:
+            return
+        self._prune()
+        try:
+            atomic_write(self.path, json.dumps(self._data))
+        except OSError as e:
+            print(e)
+            print('Unable to save the endpoint cache')
+
 
-    def _emit_signal(self, code):
-        self.auth_code_received.emit(code[0])
+class RetryScheduler(QObject):
+    """
+    Runs network operations for the CREST handler and retries the ones that fail using single shot QTimers, rather than
+    sleeping in a loop, so the worker thread's event loop keeps running (and logout, timers etc. keep working) during
+    an outage. Each retry waits twice as long as the last, up to max_delay, with some jitter. After failure_threshold
+    failures in a row the circuit opens and nothing is attempted until cooldown seconds have passed.
 
-    def run(self):
-        auth_handler_class = AuthHandler
-        auth_handler_class.functionCallback = self._emit_signal
-        self.server = StoppableHTTPServer(('', self.port), auth_handler_class)
-        self.server.serve_forever()
+    Like the handler's other timers, this needs to be created on the thread it will run on.
+    """
 
-    def exit(self, returnCode=0):
-        self.server.force_stop()
-        # We call server_forever again to insure it exits the event loop.
-        # This can also be achieved by sending a dummy request to the server, but this is easier
-        self.server.serve_forever()
-        self.terminate()
+    def __init__(self, base_delay=5, max_delay=300, failure_threshold=5, cooldown=120, parent=None):
+        super(RetryScheduler, self).__init__(parent)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.circuit_open_until = 0
+        # Timer and number of failed attempts of each pending operation, by name
+        self._timers = {}
+        self._attempts = {}
+
+    # Runs operation as soon as the circuit allows, replacing any pending retries of an operation with the same name.
+    # operation should raise a RequestException on network errors, after which on_error is called with the exception
+    # and the operation is retried. If the server turned down our credentials, or sent back something we couldn't make
+    # sense of (a ValueError, KeyError or TypeError), there's no point trying again, so the operation is dropped and
+    # on_failure is called with the exception instead
+    def run(self, name, operation, on_error=None, on_failure=None):
+        self.cancel(name)
+        self._attempts[name] = 0
+        self._schedule(name, operation, on_error, on_failure, self._circuit_delay())
+
+    def cancel(self, name):
+        timer = self._timers.pop(name, None)
+        if timer is not None:
+            timer.stop()
+            timer.deleteLater()
+        self._attempts.pop(name, None)
+
+    def cancel_all(self):
+        for name in list(self._timers):
+            self.cancel(name)
+
+    def _circuit_delay(self):
+        return max(self.circuit_open_until - monotonic(), 0)
+
+    def _schedule(self, name, operation, on_error, on_failure, delay):
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.timeout.connect(lambda: self._attempt(name, operation, on_error, on_failure))
+        self._timers[name] = timer
+        timer.start(int(delay * 1000))
+
+    def _attempt(self, name, operation, on_error, on_failure):
+        timer = self._timers.pop(name, None)
+        if timer is not None:
+            timer.deleteLater()
+        # The circuit may have opened because of another operation since this one was scheduled
+        delay = self._circuit_delay()
+        if delay > 0:
+            self._schedule(name, operation, on_error, on_failure, delay)
+            return
+
+        try:
+            operation()
+        # Bad json is a ValueError and a RequestException in newer versions of requests, it isn't worth retrying either
+        except (ValueError, KeyError, TypeError) as e:
+            print(e)
+            print('Unexpected response from the eve servers, not trying again')
+            self._fail(name, on_failure, e)
+        except requests.exceptions.RequestException as e:
+            if credentials_rejected(e):
+                print(e)
+                print('The eve servers turned down our login, not trying again')
+                self._fail(name, on_failure, e)
+                return
+            self.consecutive_failures += 1
+            self._attempts[name] = self._attempts.get(name, 0) + 1
+            delay = min(self.base_delay * 2 ** (self._attempts[name] - 1), self.max_delay) * uniform(0.75, 1.25)
+            if self.consecutive_failures >= self.failure_threshold:
+                self.circuit_open_until = monotonic() + self.cooldown
+                delay = max(delay, self.cooldown)
+            print(e)
+            print('Network error while attempting to communicate with the eve servers, trying again in ' +
+                  str(int(delay)) + ' seconds')
+            if on_error is not None:
+                on_error(e)
+            self._schedule(name, operation, on_error, on_failure, delay)
+        else:
+            self.consecutive_failures = 0
+            self._attempts.pop(name, None)
 
-    auth_code_received = pyqtSignal(str, name='auth_code_recieved')
+    def _fail(self, name, on_failure, error):
+        self._attempts.pop(name, None)
+        if on_failure is not None:
+            on_failure(error)
 
 
-class AuthHandler(BaseHTTPRequestHandler):
+class TokenManager(object):
     """
-    We need to hand the authentication code back to the eveCRESTHandler object, but the AuthHandler is passed as a
-    class to the HTTP server. To do this, we set a function pointer here that we can set statically and then
-    call to get the information out
+    Holds the OAuth tokens and refreshes the access token. A refresh is a single call to the token endpoint that only
+    swaps the token used in the Authorization header. If a refresh is requested while another is already in flight
+    (for instance by a request that got a 401 in the middle of a scheduled refresh), the caller waits for that refresh
+    and shares its result rather than starting a second one.
     """
-    functionCallback = None
 
-    def do_GET(self):
-        # We get a heap of these that we don't want to parse
-        if self.path == "/favicon.ico":
+    def __init__(self, session, token_url='https://login.eveonline.com/oauth/token', refresh_margin=60):
+        self.session = session
+        self.token_url = token_url
+        self.refresh_margin = refresh_margin  # seconds before expiry that we refresh the token
+        self.client_id = None
+        self.secret = None
+        self.access_token = None
+        self.refresh_token = None
+        self.expires_at = 0
+        self._lock = threading.Lock()
+        # [event set when the refresh finishes, exception it raised] for the refresh in flight, if there is one
+        self._in_flight = None
+
+    def set_credentials(self, client_id, secret):
+        self.client_id = client_id
+        self.secret = secret
+
+    def clear(self):
+        self.access_token = None
+        self.refresh_token = None
+        self.expires_at = 0
+
+    def get_auth_header(self):
+        return 'Bearer ' + self.access_token
+
+    # Seconds until the token should be refreshed, which is a little before it actually expires
+    def seconds_until_refresh(self):
+        return max(self.expires_at - self.refresh_margin - monotonic(), 0)
+
+    # Swaps an authorisation code from the SSO login for a set of tokens
+    def exchange_code(self, code, token_url=None):
+        self._request_tokens(token_url or self.token_url, {'grant_type': 'authorization_code', 'code': code})
+
+    # rejected_access_token is the access token a request was turned down with. If it has already been replaced (by
+    # another request that got a 401 at the same time, say) there's nothing to do
+    def refresh(self, rejected_access_token=None):
+        with self._lock:
+            in_flight = self._in_flight
+            if in_flight is None and rejected_access_token is not None and self.access_token != rejected_access_token:
+                return
+            started_here = in_flight is None
+            if started_here:
+                in_flight = self._in_flight = [threading.Event(), None]
+
+        if not started_here:
+            in_flight[0].wait()
+            if in_flight[1] is not None:
+                raise in_flight[1]
             return
+
+        try:
+            self._request_tokens(self.token_url, {'grant_type': 'refresh_token', 'refresh_token': self.refresh_token})
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            in_flight[1] = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight = None
+            in_flight[0].set()
+
+    def _request_tokens(self, token_url, query):
+        headers = {'Authorization': 'Basic ' + base64.b64encode(
+            bytes(self.client_id + ':' + self.secret, 'utf-8')).decode('utf-8')}
+        response = self.session.post(token_url, params=query, headers=headers)
+        response.raise_for_status()
+        response = response.json()
+        self.access_token = response['access_token']
+        # The refresh token isn't always sent again when refreshing, in which case the old one is still good
+        self.refresh_token = response.get('refresh_token', self.refresh_token)
+        self.expires_at = monotonic() + response['expires_in']
+
+
+class CharacterSession(object):
+    """
+    Everything the CREST handler knows about one logged in character. Each character has its own tokens, endpoints and
+    location, but they all share the handler's connection pool, retry scheduler and polling timer.
+    """
+
+    def __init__(self, http_session, client_id, secret, refresh_token=None):
+        # Names this character's operations in the retry scheduler
+        self.key = str(uuid4())
+        self.token_manager = TokenManager(http_session)
+        self.token_manager.set_credentials(client_id, secret)
+        self.token_manager.refresh_token = refresh_token
+        # The 'char' and 'location' urls for this character
+        self.end_points = {}
+        # CREST documents fetched during this login, by url
+        self.resource_cache = {}
+        self.name = "No character"
+        # Encoded image bytes, as they came from the server. Turning them into something that can be shown is left to
+        # the GUI, so the handler runs without one
+        self.portrait = None
+        self.position = "No position"
+        # ETag and cache lifetime of the last location response, so we only ask again once the server has something new
+        self.location_etag = None
+        self.location_cache_seconds = None
+        # monotonic() time the location is next due to be polled, None while it isn't being polled
+        self.next_poll = None
+        # True while a poll of the location is running on one of the polling threads
+        self.polling = False
+        # Created by the handler on its worker thread
+        self.reauth_timer = None
+
+
+class OAuthCallbackServer(QObject):
+    """
+    Tiny http server that waits for the SSO login to redirect back to us with the authorisation code. It runs an
+    asyncio event loop on a thread of its own, so starting it is just binding the port, and stopping it is stopping
+    the loop and joining the thread, which always finishes straight away and frees the port for the next login.
+
+    Only the first redirect with the right state is passed on through auth_code_received. Duplicates (for instance
+    from the page being refreshed) are answered but ignored. If no login arrives within idle_timeout seconds,
+    timed_out is emitted and the owner is expected to stop the server.
+    """
+
+    def __init__(self, port, state, idle_timeout=60, parent=None):
+        super(OAuthCallbackServer, self).__init__(parent)
+        self.port = port
+        self.state = state
+        self.idle_timeout = idle_timeout
+        self._loop = None
+        self._thread = None
+        self._code_received = False
+        self._idle_handle = None
+
+    # Returns once the server is listening (or has failed to)
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,), daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        self._thread = None
+
+    def _run(self, started):
+        asyncio.set_event_loop(self._loop)
+        try:
+            server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle_connection, 'localhost', self.port))
+        except OSError as e:
+            print(e)
+            print('Unable to listen for the SSO login on port ' + str(self.port))
+            self._loop.close()
+            started.set()
+            return
+
+        self._idle_handle = self._loop.call_later(self.idle_timeout, self.timed_out.emit)
+        started.set()
+        self._loop.run_forever()
+
+        server.close()
+        # Drop any browsers that are still connected rather than waiting for them
+        connections = asyncio.all_tasks(self._loop)
+        for task in connections:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*connections, return_exceptions=True))
+        self._loop.run_until_complete(server.wait_closed())
+        self._loop.close()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            await self._reply(reader, writer)
+        finally:
+            writer.close()
+
+    async def _reply(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            # We don't need any of the headers, but they need to be read before we reply
+            while True:
+                line = await asyncio.wait_for(reader.readline(), 10)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            return
+
+        parts = request_line.decode('latin-1').split()
+        path = parts[1] if len(parts) > 1 else '/'
+        returned_values = urlparse.parse_qs(urlparse.urlparse(path).query)
+        code = returned_values.get('code', [None])[0]
+        state = returned_values.get('state', [None])[0]
+
         # response_html is actually interpreted html. Here it is just plain text, but if you go to modify it, keep
         # that in mind.
         # TODO: A little CSS would make this look a heap better
-        response_html = 'SSO login success. You can now close this page.'
-        self.send_response(200)
-        self.send_header("Connection", "Close")
-        self.end_headers()
-        self.wfile.write(bytes(response_html, 'utf-8'))
-        returned_values = urlparse.parse_qs(urlparse.urlparse(self.path).query)
-        try:
-            return_code = returned_values['code']
-            state = returned_values['state'][0]
-            if EveCRESTHandler.state == state:
-                self.functionCallback(return_code)
-        except KeyError as e:
+        if path == '/favicon.ico':
+            # We get a heap of these that we don't want to parse
+            status, response_html = '404 Not Found', ''
+        elif code is None or state != self.state:
             print('HTTP response was lacking the correct information')
-            print(e)
+            status, response_html = '400 Bad Request', 'SSO login failed. Please try logging in again.'
+        else:
+            if not self._code_received:
+                self._code_received = True
+                self._idle_handle.cancel()
+                self.auth_code_received.emit(code)
+            status, response_html = '200 OK', 'SSO login success. You can now close this page.'
+
+        body = bytes(response_html, 'utf-8')
+        writer.write(bytes('HTTP/1.1 ' + status + '\r\nContent-Type: text/html; charset=utf-8\r\nContent-Length: ' +
+                           str(len(body)) + '\r\nConnection: close\r\n\r\n', 'utf-8') + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
 
-    # Stops printing all GETs to the terminal
-    def log_message(self, format, *args):
-        return
+    auth_code_received = pyqtSignal(str, name='auth_code_received')
+    timed_out = pyqtSignal(name='timed_out')
 
 
 class EveCRESTHandler(QObject):
@@ -120,12 +571,17 @@ class EveCRESTHandler(QObject):
     Wrapper class to handle the connection, authentication and receiving of CREST data. I know PyCrest exists that
     probably does this much better than this implementation, but I wanted to use this opportunity to understand
     OAuth 2 at a lower level.
+
+    Any number of characters can be logged in at once, each as a CharacterSession. The first one is the primary
+    character, which is the one shown in the CREST window and reported through new_char_location. Every character's
+    moves are reported through character_location_changed.
     """
 
     # Random value used for the state param of OAuth 2
     state = str(uuid4())
 
-    def __init__(self, parent=None, user_agent='eveExploHelper', port=4173):
+    def __init__(self, parent=None, user_agent='eveExploHelper', port=4173, portrait_cache_dir=None,
+                 endpoint_cache_path=None):
         super(self.__class__, self).__init__(parent)
 
         self.worker_thread = QThread()
@@ -136,53 +592,61 @@ class EveCRESTHandler(QObject):
         self.endPoints = None
         self.clientID = None
         self.secret = None
-        self.refreshToken = None
-        self.accessToken = None
-        self.server_thread = None
+        self.callback_server = None
         self.headers = {'User-Agent': user_agent}
-        self.authheaders = None
-        self.character_name = "No character"
         self.status = self.Statuses.blank
-        self.character_position = "No position"
+        self.sessions = []
+        self.portrait_cache = PortraitCache(portrait_cache_dir)
+        self.endpoint_cache = EndpointCache(endpoint_cache_path)
+        # Portrait image bytes by (character url, size). These are kept across logins so re-authenticating never has to
+        # download the portrait again
+        self.portrait_images = {}
+        self.poll_jitter = 0.5  # seconds of random delay added after the cache expires, so we land just after it
+        self.poll_tick = 1  # seconds between checks for characters that are due a location poll
         self.http_timeout = 10  # seconds before assuming http connection has timed out
-        self.delay_before_retry = 5  # seconds before retrying the http connection
-
-        tmp_char_image = QPixmap(128, 128)
-        tmp_char_image.fill(QColor(0, 0, 0))
-        self.character_portrait = tmp_char_image
+        # Every request goes through this one session so connections to the eve servers are kept alive between polls
+        self.session = PooledSession(user_agent=user_agent, timeout=self.http_timeout, max_per_host=4)
+        # Polls the locations of characters that are due in the same tick in parallel
+        self.poll_executor = ThreadPoolExecutor(max_workers=4)
 
         # Important note : These timers need to be initialised outside of the __init__ function or they won't fire
         # We create them in the separate setup function instead
-        self.reauth_timer = None
         self.update_location_timer = None
-        self.idle_http_server_shutdown_timer = None
+        self.retry_scheduler = None
+        # Tokens refreshed and locations polled on the polling threads are handled back on this one
+        self._refresh_token_changed.connect(self._handle_refresh_token_changed, Qt.QueuedConnection)
+        self._position_polled.connect(self._handle_position_polled, Qt.QueuedConnection)
 
-    # Public slot that we use to initialise the timers on the correct thread so they fire correctly
+    # Public slot that we use to initialise the timers on the correct thread so they fire correctly. refresh_token can
+    # hold the refresh tokens of several characters separated by spaces
     @pyqtSlot(str, str, str)
     def setup(self, client_ID=None, secret=None, refresh_token=''):
 
-        # Timer that handles reauthenticating when the credentials expire
-        self.reauth_timer = QTimer()
-        self.reauth_timer.timeout.connect(self.auth_via_refresh_token)
-        # Timer that handles polling for character location updates
+        # Timer that checks for characters that are due a location poll. Every character shares this one timer
         self.update_location_timer = QTimer()
         self.update_location_timer.timeout.connect(self._handle_position_update)
-        # Timer that handles shutting down the http server if no response is given within 60 seconds
-        self.idle_http_server_shutdown_timer = QTimer()
-        self.idle_http_server_shutdown_timer.timeout.connect(self._http_server_timeout)
-        self.idle_http_server_shutdown_timer.setInterval(60000)
-
-        try:
-            self._setup_public_endpoints()
-        except requests.exceptions.RequestException as e:
-            # Unable to setup public endpoint. We'll try again later, so not a huge deal at the moment
-            print(e)
+        self.update_location_timer.start(self.poll_tick * 1000)
+        # Retries anything that failed because of network errors
+        self.retry_scheduler = RetryScheduler(parent=self)
+
+        cached_end_points = self.endpoint_cache.get_public()
+        if cached_end_points is not None:
+            self.endPoints = cached_end_points
+            # Check they are still right once everything else has got going
+            self.retry_scheduler.run('public endpoints', self._fetch_public_endpoints)
+        else:
+            try:
+                self._setup_public_endpoints()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # Unable to setup public endpoint. We'll try again later, so not a huge deal at the moment
+                print(e)
 
         self.clientID = client_ID
         self.secret = secret
-        if refresh_token != '':
-            self.refreshToken = refresh_token
-            self.auth_via_refresh_token()
+        refresh_tokens = refresh_token.split()
+        if refresh_tokens:
+            for token in refresh_tokens:
+                self.auth_via_refresh_token(self._add_session(token))
         else:
             self._update_status(self.Statuses.waiting_for_credentials)
 
@@ -203,31 +667,39 @@ class EveCRESTHandler(QObject):
     def get_status(self):
         return self.status
 
-    def auth_via_refresh_token(self):
+    def auth_via_refresh_token(self, session):
         self._update_status(self.Statuses.authenticating_via_refresh_token)
-        headers = {
-            'Authorization': 'Basic ' + base64.b64encode(bytes(self.clientID + ':' + self.secret, 'utf-8')).decode(
-                'utf-8'),
-            'User-Agent': 'eveExploHelper'}
-        query = {'grant_type': 'refresh_token', 'refresh_token': self.refreshToken}
-        while True:
-            try:
-                response = requests.post('https://login.eveonline.com/oauth/token', params=query, headers=headers,
-                                         timeout=self.http_timeout).json()
-                self.accessToken = response['access_token']
-                self.reauth_timer.start(
-                    (response['expires_in'] - 30) * 1000)  # Refresh the token 30 seconds before expiry
-                self._setup_auth_headers()
-                self._setup_authed_endpoints()
-                self.set_basic_char_data()
-                break
-            except requests.exceptions.RequestException as e:
-                print(e)
-                print('Network error while attempting to communicate with the eve servers, trying again in 5 seconds')
-                self._update_status(self.Statuses.error)
-                sleep(5)
-
-        self._setup_auth_headers()
+        self.retry_scheduler.run('auth ' + session.key, lambda: self._auth_via_refresh_token_attempt(session),
+                                 on_error=self._handle_network_error,
+                                 on_failure=lambda error: self._handle_failure(session, error))
+
+    def _auth_via_refresh_token_attempt(self, session):
+        # Looked up with the token we were started with, as refreshing can swap it for one the cache hasn't seen yet
+        cached = self._use_cached_authed_endpoints(session)
+        self._refresh_access_token_attempt(session)
+        if cached:
+            # Poll from the cached urls as soon as we have an access token, and check the rest in the background
+            session.next_poll = monotonic()
+            self._handle_position_update()
+            self.retry_scheduler.run('discovery ' + session.key, lambda: self._discovery_attempt(session),
+                                     on_error=self._handle_network_error,
+                                     on_failure=lambda error: self._handle_failure(session, error))
+        else:
+            self._discovery_attempt(session)
+
+    def _discovery_attempt(self, session):
+        self._setup_authed_endpoints(session)
+        self.set_basic_char_data(session)
+
+    # Fills in the urls for this character if we know them from a previous run, so polling can start without discovery
+    def _use_cached_authed_endpoints(self, session):
+        cached = self.endpoint_cache.get_character(session.token_manager.refresh_token)
+        if cached is None:
+            return False
+        session.end_points['char'] = cached['char']
+        session.end_points['location'] = cached['location']
+        session.name = cached.get('name') or session.name
+        return True
 
     @pyqtSlot(name='sso_auth')
     def sso_auth(self):
@@ -237,179 +709,326 @@ class EveCRESTHandler(QObject):
             'http://localhost:' + str(
                 self.port) + '/&client_id=' + self.clientID + '&scope=characterLocationRead&state=' + self.state)
         self._update_status(self.Statuses.waiting_for_http_response)
-        self.idle_http_server_shutdown_timer.start()
 
+    # Logs out every character
     @pyqtSlot()
     def logout(self):
-        tmp_char_image = QPixmap(128, 128)
-        tmp_char_image.fill(QColor(0, 0, 0))
-        self.character_portrait = tmp_char_image
-        self.authheaders = None
-        self.reauth_timer.stop()
-        self.update_location_timer.stop()
-        self.character_name = "No character"
+        self.retry_scheduler.cancel_all()
+        for session in list(self.sessions):
+            self._remove_session(session)
 
         self._update_status(self.Statuses.waiting_for_credentials)
 
-        self.character_information_updated.emit(self.character_name, self.character_portrait)
+        self.character_information_updated.emit(self.get_character_name(), self.get_character_portrait())
 
-    def set_basic_char_data(self):
-        while True:
-            try:
-                self.character_name = self._retrieve_character_name()
-                break
-            except requests.exceptions.RequestException:
-                self._update_status(self.Statuses.error)
-                sleep(5)
+    # Raises a RequestException if it couldn't get everything, so it can be retried
+    def set_basic_char_data(self, session):
+        session.name = self._retrieve_character_name(session)
 
-        while True:
-            try:
-                character_portrait_bytes = self._retrieve_character_portrait_bytes()
-                image = QImage()
-                image.loadFromData(character_portrait_bytes)
-                self.character_portrait = QPixmap(image)
-                break
-            except requests.exceptions.RequestException:
-                self._update_status(self.Statuses.error)
-                sleep(5)
+        portrait_key = (session.end_points.get('char'), '128x128')
+        if portrait_key not in self.portrait_images:
+            self.portrait_images[portrait_key] = self._retrieve_character_portrait_bytes(session, size=portrait_key[1])
+        session.portrait = self.portrait_images[portrait_key]
 
-        if self.character_name is not None and self.character_portrait is not None:
+        if session.name is not None and session.portrait is not None:
             self._update_status(self.Statuses.connected)
-            self.character_information_updated.emit(self.character_name, self.character_portrait)
+            if session is self._get_primary_session():
+                self.character_information_updated.emit(session.name, session.portrait)
         else:
             self._update_status(self.Statuses.error)
 
+    # Each SSO login adds another character. Logging in a character we already have replaces the old session
     @pyqtSlot(str)
     def auth_via_code(self, code):
         self._stop_http_server()
-        self.idle_http_server_shutdown_timer.stop()
-        headers = self.headers
-        headers['Authorization'] = 'Basic ' + base64.b64encode(
-            bytes(self.clientID + ':' + self.secret, 'utf-8')).decode('utf-8')
-        query = {'grant_type': 'authorization_code', 'code': code}
-        # Try to get a response every 5 seconds
-        while True:
-            try:
-                response = requests.post(self.endPoints['authEndpoint']['href'], params=query, headers=headers).json()
-                access_token = response['access_token']
-                self.accessToken = access_token
-                self.refreshToken = response['refresh_token']
-                self.new_refresh_token.emit(self.refreshToken)
-                self.reauth_timer.start(
-                    (response['expires_in'] - 30) * 1000)  # Refresh the token 30 seconds before expiry
-                self._setup_auth_headers()
-                self._setup_authed_endpoints()
-                self.set_basic_char_data()
-                break
-            except requests.exceptions.RequestException as e:
-                print(e)
-                print('Network error while attempting to authenticate with the eve servers, trying again in 5 seconds')
-                self._update_status(self.Statuses.error)
-                sleep(5)
+        session = self._add_session()
+        # The code can only be swapped for tokens once, so this isn't retried. If it fails, the user has to log in again
+        try:
+            if self.endPoints is None:
+                # The network was down at startup, so we don't know where the auth endpoint is yet
+                self._setup_public_endpoints()
+            session.token_manager.exchange_code(code, token_url=self.endPoints['authEndpoint']['href'])
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            print(e)
+            print('Unable to log in with the SSO code, please try logging in again')
+            self._remove_session(session)
+            self._update_status(self.Statuses.waiting_for_credentials)
+            return
+        self._start_reauth_timer(session)
+        self._emit_refresh_tokens()
+        self.retry_scheduler.run('discovery ' + session.key, lambda: self._code_discovery_attempt(session),
+                                 on_error=self._handle_network_error,
+                                 on_failure=lambda error: self._handle_failure(session, error))
+
+    def _code_discovery_attempt(self, session):
+        self._setup_authed_endpoints(session)
+        for other_session in list(self.sessions):
+            if other_session is not session and other_session.end_points.get('char') == session.end_points['char']:
+                self._remove_session(other_session)
+        self._emit_refresh_tokens()
+        self.set_basic_char_data(session)
 
     def get_character_position(self):
-        return self.character_position
+        session = self._get_primary_session()
+        return session.position if session is not None else "No position"
 
+    # The primary character's portrait as encoded image bytes, or None if we don't have one
     def get_character_portrait(self):
-        return self.character_portrait
+        session = self._get_primary_session()
+        return session.portrait if session is not None else None
 
     def get_character_name(self):
-        return self.character_name
+        session = self._get_primary_session()
+        return session.name if session is not None else "No character"
+
+    # {session key: (character name, position)} of every logged in character, starting with the primary one. Keyed on
+    # the session, as characters we haven't got the name of yet all share the same placeholder name
+    def get_character_positions(self):
+        return OrderedDict((session.key, (session.name, session.position)) for session in self.sessions)
+
+    def get_connection_stats(self):
+        return self.session.get_connection_stats()
+
+    def _get_primary_session(self):
+        return self.sessions[0] if self.sessions else None
+
+    def _get_session(self, session_key):
+        for session in self.sessions:
+            if session.key == session_key:
+                return session
+        return None
+
+    def _add_session(self, refresh_token=None):
+        session = CharacterSession(self.session, self.clientID, self.secret, refresh_token)
+        session.reauth_timer = QTimer(self)
+        session.reauth_timer.setSingleShot(True)
+        session.reauth_timer.timeout.connect(lambda: self._refresh_access_token(session))
+        self.sessions.append(session)
+        return session
+
+    def _remove_session(self, session):
+        for operation in ('auth ', 'discovery ', 'refresh '):
+            self.retry_scheduler.cancel(operation + session.key)
+        session.reauth_timer.stop()
+        session.reauth_timer.deleteLater()
+        session.token_manager.clear()
+        session.next_poll = None
+        self.sessions.remove(session)
+
+    # The refresh tokens of all the characters go out as one space separated string, the same format setup takes
+    def _emit_refresh_tokens(self):
+        self.new_refresh_token.emit(' '.join(session.token_manager.refresh_token for session in self.sessions
+                                             if session.token_manager.refresh_token))
 
     def _update_status(self, new_status):
         self.status = new_status
         self.status_updated.emit(new_status)
 
+    def _handle_network_error(self, error):
+        self._update_status(self.Statuses.error)
+
+    # Called when one of the character's operations failed in a way that retrying won't fix
+    def _handle_failure(self, session, error):
+        if credentials_rejected(error):
+            self._handle_credentials_rejected(session)
+        else:
+            self._update_status(self.Statuses.error)
+
+    # The character's tokens are no good any more, so they're logged out and the user is asked to log in again
+    def _handle_credentials_rejected(self, session):
+        if session in self.sessions:
+            was_primary = session is self._get_primary_session()
+            self._remove_session(session)
+            self._emit_refresh_tokens()
+            if was_primary:
+                self.character_information_updated.emit(self.get_character_name(), self.get_character_portrait())
+        self._update_status(self.Statuses.waiting_for_credentials)
+
     def _http_server_timeout(self):
         self._stop_http_server()
         self._update_status(self.Statuses.waiting_for_credentials)
 
+    # Runs every tick. All the characters that are due are polled together, in parallel over the shared connection
+    # pool, so more characters means more requests per wake up rather than more wake ups. The polls run on the pool's
+    # threads and their results come back through _position_polled, so this thread (and with it logout, retries and
+    # token refreshes) never waits on the network
     def _handle_position_update(self):
-        new_pos = self._retrieve_character_position()
+        now = monotonic()
+        due_sessions = [session for session in self.sessions
+                        if not session.polling and session.next_poll is not None and session.next_poll <= now]
+        if not due_sessions:
+            return
+        self._update_status(self.Statuses.getting_character_position)
+        for session in due_sessions:
+            session.polling = True
+            self.poll_executor.submit(self._poll_position, session).add_done_callback(
+                lambda future, session_key=session.key: self._position_polled.emit(
+                    session_key, None if future.exception() is not None else future.result()))
+
+    def _handle_position_polled(self, session_key, new_pos):
+        session = self._get_session(session_key)
+        if session is None:
+            # Logged out while it was being polled
+            return
+        session.polling = False
+        if new_pos is _CREDENTIALS_REJECTED:
+            self._handle_credentials_rejected(session)
+            return
+        if new_pos is None:
+            # Network error, try again in a little while
+            self._update_status(self.Statuses.error)
+            session.next_poll = monotonic() + 5
+            return
+        self._update_status(self.Statuses.connected)
 
-        if new_pos != self.character_position:
+        if new_pos != session.position:
             # We have a new location
-            self.new_char_location.emit(new_pos)
-            self.character_position = new_pos
+            session.position = new_pos
+            self.character_location_changed.emit(session.name, new_pos)
+            if session is self._get_primary_session():
+                self.new_char_location.emit(new_pos)
 
         # We poll slower if the character is offline. Even though polling every 5 seconds is within the rate limits, it's not needed
-        # The location is cached server side for a duration of 5 seconds, so no point in polling faster
-        if self.character_position == "Offline":
-            self.update_location_timer.setInterval(60 * 1000)  # 60 seconds
+        # Otherwise the location is cached server side, so we poll again just after the cached copy expires. If the
+        # server didn't tell us how long that is, it's normally 5 seconds
+        if session.position == "Offline":
+            delay = 60
+        elif session.location_cache_seconds is None:
+            delay = 5
         else:
-            self.update_location_timer.setInterval(5 * 1000)  # 5 seconds
+            delay = max(session.location_cache_seconds, 1) + uniform(0, self.poll_jitter)
+        session.next_poll = monotonic() + delay
 
-    def _setup_auth_headers(self):
-        self.authheaders = self.headers
-        self.authheaders['Authorization'] = 'Bearer ' + self.accessToken
-
-    def _setup_authed_endpoints(self):
+    # Runs on the polling threads, so anything that needs to change the sessions or the status is left to
+    # _handle_position_polled
+    def _poll_position(self, session):
+        try:
+            return self._retrieve_character_position(session)
+        except (ValueError, KeyError, TypeError) as e:
+            print(e)
+            print('Unexpected response retrieving character location')
+            return None
+        except requests.exceptions.RequestException as e:
+            return _CREDENTIALS_REJECTED if credentials_rejected(e) else None
+
+    # Refreshing only swaps the access token. Everything we already know about the character is still good
+    def _refresh_access_token(self, session):
+        self.retry_scheduler.run('refresh ' + session.key, lambda: self._refresh_access_token_attempt(session),
+                                 on_error=self._handle_network_error,
+                                 on_failure=lambda error: self._handle_failure(session, error))
+
+    def _refresh_access_token_attempt(self, session):
+        self._refresh_tokens(session)
+        self._start_reauth_timer(session)
+
+    # Every refresh goes through here, so that if the SSO hands out a new refresh token it's saved and the old one,
+    # which no longer works, is forgotten. Runs on the polling threads too, in which case saving is left to the
+    # handler's own thread
+    def _refresh_tokens(self, session, rejected_access_token=None):
+        old_refresh_token = session.token_manager.refresh_token
+        session.token_manager.refresh(rejected_access_token)
+        if session.token_manager.refresh_token != old_refresh_token:
+            if QThread.currentThread() is self.thread():
+                self._save_refresh_token(session)
+            else:
+                self._refresh_token_changed.emit(session.key)
+
+    def _handle_refresh_token_changed(self, session_key):
+        session = self._get_session(session_key)
+        if session is not None:
+            self._save_refresh_token(session)
+
+    def _save_refresh_token(self, session):
+        self._emit_refresh_tokens()
+        # The endpoint cache finds characters by their refresh token at startup
+        if 'location' in session.end_points:
+            self.endpoint_cache.set_character(session.token_manager.refresh_token, session.end_points['char'],
+                                              session.end_points['location'], session.name)
+
+    def _start_reauth_timer(self, session):
+        session.reauth_timer.start(int(session.token_manager.seconds_until_refresh() * 1000))
+
+    # GET with the character's access token. If the server says the token is no longer good, it's refreshed once and
+    # the request tried again. Requests that are turned down together share one refresh. This can run on the polling
+    # threads, so it leaves the reauth timer alone; at worst the timer refreshes the token again a little early
+    def _authed_get(self, session, url, headers=None):
+        headers = dict(headers or {})
+        access_token = session.token_manager.access_token
+        headers['Authorization'] = 'Bearer ' + access_token
+        response = self.session.get(url, headers=headers)
+        if response.status_code == 401:
+            self._refresh_tokens(session, rejected_access_token=access_token)
+            headers['Authorization'] = session.token_manager.get_auth_header()
+            response = self.session.get(url, headers=headers)
+        return response
+
+    # Raises a RequestException if it couldn't get everything, so it can be retried
+    def _setup_authed_endpoints(self, session):
         self._update_status(self.Statuses.obtaining_authenticated_endpoints)
 
         # We need the public decode endpoint here. We try and initialise it on creation,
         # but if it's not set at the moment (eg the network was down when the program was launched), we need to set it now
-        if 'href' not in self.endPoints.get('decode', {}):
-            while True:
-                # Need to set the public endpoint
-                try:
-                    self._setup_public_endpoints()
-                    break
-                except requests.exceptions.RequestException as e:
-                    # Network error
-                    print(e)
-                    print(
-                        'Network error while attempting to communicate with the eve servers, trying again in 5 seconds')
-                    self._update_status(self.Statuses.error)
-                    sleep(self.delay_before_retry)
+        if self.endPoints is None or 'href' not in self.endPoints.get('decode', {}):
+            self._setup_public_endpoints()
 
         root_node = self.endPoints['decode']['href']
-
-        while True:
-            try:
-                self.endPoints['char'] = \
-                    requests.get(root_node, headers=self.authheaders, timeout=self.http_timeout).json()['character'][
-                        'href']
-                self.endPoints['location'] = \
-                    requests.get(self.endPoints['char'], headers=self.authheaders, timeout=self.http_timeout).json()[
-                        'location']['href']
-                break
-            except requests.exceptions.RequestException as e:
-                print(e)
-                print('Network error while attempting to communicate with the eve servers, trying again in 5 seconds')
-                self._update_status(self.Statuses.error)
-                sleep(5)
-
-        self.update_location_timer.setInterval(5000)
-        self.update_location_timer.start()
-
-    def _retrieve_character_position(self):
-        self._update_status(self.Statuses.getting_character_position)
-        if 'location' in self.endPoints:
+        old_location = session.end_points.get('location')
+        session.end_points['char'] = self._get_resource(session, root_node)['character']['href']
+        character = self._get_resource(session, session.end_points['char'])
+        session.end_points['location'] = character['location']['href']
+        session.name = character.get('name', session.name)
+        self.endpoint_cache.set_character(session.token_manager.refresh_token, session.end_points['char'],
+                                          session.end_points['location'], session.name)
+
+        # If we were already polling from cached urls that turned out to be right, there's no need to restart
+        if session.next_poll is None or old_location != session.end_points['location']:
+            session.next_poll = monotonic()
+
+    # The same character document gives us the location, name and portrait urls, so each document is only fetched
+    # once per login. Anything that changes (like the location) shouldn't go through here
+    def _get_resource(self, session, url):
+        if url not in session.resource_cache:
+            response = self._authed_get(session, url)
+            response.raise_for_status()
+            session.resource_cache[url] = response.json()
+        return session.resource_cache[url]
+
+    # Runs on the polling threads, so the status is left to _handle_position_polled
+    def _retrieve_character_position(self, session):
+        if 'location' in session.end_points:
             try:
-                response = requests.get(self.endPoints['location'], headers=self.authheaders,
-                                        timeout=self.http_timeout).json()
+                headers = {}
+                if session.location_etag is not None:
+                    headers['If-None-Match'] = session.location_etag
+                response = self._authed_get(session, session.end_points['location'], headers=headers)
+                session.location_cache_seconds = seconds_until_expiry(response)
+                if response.status_code == 304:
+                    # Nothing has changed since the last time we asked
+                    return session.position
+                response.raise_for_status()
+                session.location_etag = response.headers.get('ETag')
+                response = response.json()
                 if 'solarSystem' in response:
                     new_pos = response['solarSystem']['name']
                 else:
                     new_pos = 'Offline'
-                self._update_status(self.Statuses.connected)
                 return new_pos
             except requests.exceptions.RequestException as e:
                 print(e)
                 print("Network error retrieving character location")
-                self._update_status(self.Statuses.error)
                 raise
         else:
             print('Location endpoint not set')
 
-    def _retrieve_character_portrait_bytes(self, size='128x128'):
+    def _retrieve_character_portrait_bytes(self, session, size='128x128'):
         self._update_status(self.Statuses.getting_character_portrait)
-        if 'char' in self.endPoints:
+        if 'char' in session.end_points:
             try:
-                avatar_url = \
-                    requests.get(self.endPoints['char'], headers=self.authheaders, timeout=self.http_timeout).json()[
-                        'portrait'][size]['href']
-                data = requests.get(avatar_url).content
+                character = self._get_resource(session, session.end_points['char'])
+                avatar_url = character['portrait'][size]['href']
+                # Fall back to the id at the end of the character url if the document doesn't include it
+                character_id = character.get('id', session.end_points['char'].rstrip('/').split('/')[-1])
+                data = self.portrait_cache.fetch(self.session, avatar_url, character_id, size)
                 self._update_status(self.Statuses.connected)
                 return data
             except requests.exceptions.RequestException as e:
@@ -420,12 +1039,11 @@ class EveCRESTHandler(QObject):
         else:
             print('Character endpoint not set')
 
-    def _retrieve_character_name(self):
+    def _retrieve_character_name(self, session):
         self._update_status(self.Statuses.getting_character_name)
-        if 'char' in self.endPoints:
+        if 'char' in session.end_points:
             try:
-                response = requests.get(self.endPoints['char'], headers=self.authheaders,
-                                        timeout=self.http_timeout).json()
+                response = self._get_resource(session, session.end_points['char'])
                 self._update_status(self.Statuses.connected)
                 return response['name']
             except requests.exceptions.RequestException as e:
@@ -437,26 +1055,39 @@ class EveCRESTHandler(QObject):
             print('Character endpoint not set')
 
     def _start_http_server(self):
-        self.server_thread = HttpServerThread(port=self.port)
-        self.server_thread.auth_code_received.connect(self.auth_via_code)
-        self.server_thread.start()
+        # Pressing login again before finishing the last one starts over
+        self._stop_http_server()
+        # The server shuts itself down if no response is given within 60 seconds
+        self.callback_server = OAuthCallbackServer(self.port, self.state, idle_timeout=60)
+        self.callback_server.auth_code_received.connect(self.auth_via_code)
+        self.callback_server.timed_out.connect(self._http_server_timeout)
+        self.callback_server.start()
 
     def _stop_http_server(self):
-        if self.server_thread is not None:
-            if self.server_thread.isRunning():
-                self.server_thread.exit()
-                self.server_thread = None
+        if self.callback_server is not None:
+            self.callback_server.stop()
+            self.callback_server = None
 
     def _setup_public_endpoints(self):
         self._update_status(self.Statuses.obtaining_public_endpoints)
         try:
-            self.endPoints = requests.get('https://crest-tq.eveonline.com', headers=self.headers,
-                                          timeout=self.http_timeout).json()
+            self._fetch_public_endpoints()
         # TODO: Perhaps try and handle the different exceptions differently. For now, a catch all will do
         except requests.exceptions.RequestException:
             raise
 
+    def _fetch_public_endpoints(self):
+        self.endPoints = self.session.get('https://crest-tq.eveonline.com', headers=self.headers).json()
+        self.endpoint_cache.set_public(self.endPoints)
+
     new_char_location = pyqtSignal(str, name='new_char_location')
+    # Character name, new position. Sent for every logged in character
+    character_location_changed = pyqtSignal(str, str, name='character_location_changed')
     new_refresh_token = pyqtSignal(str, name='new_refresh_token')
+    # Session key, new position (or None / _CREDENTIALS_REJECTED), from the polling threads
+    _position_polled = pyqtSignal(str, object)
+    # Key of the session whose refresh token was swapped on a polling thread
+    _refresh_token_changed = pyqtSignal(str)
+    # Character name, portrait image bytes (or None)
     character_information_updated = pyqtSignal(str, object, name='charactor_information_updated')
     status_updated = pyqtSignal(object, name='status_updated')
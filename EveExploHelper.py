@@ -17,23 +17,25 @@
     along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-# Requests is apache 2.0 licenced
-import requests
-# Keyboard is MIT licenced
-import keyboard
+# Python standard library is PSF licenced
+from time import perf_counter
+# Taken before anything else is imported, so the startup timeline includes the imports
+STARTUP_STARTED = perf_counter()
+
 # PyQt is GPL v3
 from PyQt5 import QtWidgets, QtGui
 from PyQt5.QtWidgets import QFileDialog, QMessageBox, QPushButton
-from PyQt5.QtCore import QSettings, pyqtSignal, pyqtSlot, Qt, QTimer
+from PyQt5.QtCore import pyqtSignal, pyqtSlot, Qt, QTimer
 # Python standard library is PSF licenced
 import os
 import sys
-import re
+from collections import OrderedDict
 import wave
-# Simple audio is MIT licenced
-import simpleaudio as sa
 # Other files from this project, GPL v3 licenced
-from EveCRESTHandler import EveCRESTHandler
+# EveCRESTHandler, EvePraisalHandler (and requests with them), SoundBank and the keyboard library are imported when
+# they're first needed, to get the window up sooner
+from ExploCore import ExploCore
+from Settings import Settings, WatchedFile
 from ui.mainWindow import Ui_MainWindow
 from ui.keyBindDialog import Ui_KeyBindDialog
 from ui.featuresWindow import Ui_FeaturesWindow
@@ -41,85 +43,119 @@ from ui.featuresWindow import Ui_FeaturesWindow
 MAX_FONT_SIZE = 256
 PORT = 4173
 VERSION = '1.0.0'
+WORMHOLE_TYPES_FILE = 'wormholes.csv'
+# Settings that are only read when the program starts
+RESTART_REQUIRED_SETTINGS = frozenset(['crest_client_id', 'crest_secret', 'port', 'appraisal_backend', 'price_snapshot',
+                                       'appraisal_cache_ttl', 'appraisal_cache_size', 'systems_path',
+                                       'stargates_path'])
 # TODO implement this
 # The idea is to use the wormhole name we have to get a risk assessment from http://wh.pasta.gg/ or similar
 feature_risk_assess_wormhole = True
 
 
-# Called if the settings ini is not found, we write a new one with the default settings
-def write_default_settings(settings):
-    settings.setValue('main/shortcut', 'shift+0+9')
-
-    settings.setValue('CREST/client_id', '')
-    settings.setValue('CREST/secret', '')
-    settings.setValue('CREST/saveRefreshToken', 0)
-    settings.setValue('CREST/refreshToken', '')
-
-    settings.setValue('features/reminderBookmarkWormhole', 1)
-    settings.setValue('features/evePraisalClipboard', 1)
-    settings.setValue('features/wormholeTypeKeycombo', 1)
-    settings.setValue('features/reminderBookmarkWormholeSound', 1)
-    settings.setValue('features/reminderBookmarkWormholeFlashText', 1)
-
-    settings.setValue('sound/path', 'bookmarkTheHole.wav')
-
-    settings.setValue('network/port', 4173)
-
-
-# Get's a price estimate from evepraisal
-def get_price_estimate(content):
-    r = requests.post('http://evepraisal.com/estimate', data={'raw_paste': content,
-                                                              'hide_buttons': "false",
-                                                              'paste_autosubmit': "false",
-                                                              'market': "30000142",  # Jita
-                                                              'save': "false"})
-
-    # What follows is a fairly hacky way of scraping the isk value from the returned webpage. This should probably
-    # be made more robust
-    return_string = r.content.decode()
-    start_string = r'<td colspan="3" style="text-align: right"><span class="nowrap">Total Sell Value</span><br />'
-    end_string = r'</th>'
+# Prints how long after launch each stage of startup finished, so slow launches can be tracked down
+def log_startup_stage(stage):
+    print('Startup: ' + stage + ' after ' + format((perf_counter() - STARTUP_STARTED) * 1000, '.0f') + ' ms')
+
+
+class FontFitter(object):
+    """
+    Finds the largest point size at which a label's text still fits inside the label. Every QFontMetrics build is
+    fairly expensive, and this runs on every resize event, so instead of stepping through every point size we binary
+    search the (monotonic) size range and remember the answer for recently seen text / font / label size combinations.
+    While the window is being dragged, the previous fit is scaled to the new label size and used as the starting guess,
+    which usually brackets the answer within a couple of metric builds.
+    """
+
+    def __init__(self, cache_size=256, max_font_size=MAX_FONT_SIZE):
+        self.cache_size = cache_size
+        self.max_font_size = max_font_size
+        self._cache = OrderedDict()
+        # (text, family, width, height, size) of the last fit, used by the resize fast path
+        self._last_fit = None
+
+    def fit(self, label):
+        font = label.font()
+        text = label.text()
+        contents_rect = label.contentsRect()
+        key = (text, font.family(), contents_rect.width(), contents_rect.height())
+
+        font_size = self._cache.get(key)
+        if font_size is None:
+            font_size = self._search(font, text, key[2], key[3], self._scaled_guess(key))
+            self._cache[key] = font_size
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+
+        self._last_fit = key + (font_size,)
+        font.setPointSize(font_size)
+        label.setFont(font)
+
+    def clear(self):
+        self._cache.clear()
+        self._last_fit = None
+
+    # If only the label size changed since the last fit, the text scales roughly linearly with the point size, so the
+    # last size scaled by the tighter of the two dimension ratios is a very good first guess
+    def _scaled_guess(self, key):
+        if self._last_fit is None or self._last_fit[0:2] != key[0:2]:
+            return None
+        last_width, last_height, last_size = self._last_fit[2:]
+        if last_width <= 0 or last_height <= 0:
+            return None
+        scale = min(key[2] / last_width, key[3] / last_height)
+        return min(max(int(last_size * scale), 1), self.max_font_size)
+
+    def _fits(self, font, text, width, height, font_size):
+        font.setPointSize(font_size)
+        bounding_rect = QtGui.QFontMetrics(font).boundingRect(text)
+        return bounding_rect.width() <= width and bounding_rect.height() <= height
+
+    def _search(self, font, text, width, height, guess=None):
+        # The largest size known to fit and the smallest size known not to
+        fits, too_big = 0, self.max_font_size + 1
+
+        if guess is not None:
+            # Gallop outwards from the guess until the answer is bracketed
+            step = 1
+            if self._fits(font, text, width, height, guess):
+                fits = guess
+                while fits + step < too_big:
+                    if self._fits(font, text, width, height, fits + step):
+                        fits += step
+                        step *= 2
+                    else:
+                        too_big = fits + step
+                        break
+            else:
+                too_big = guess
+                while too_big - step > fits:
+                    if self._fits(font, text, width, height, too_big - step):
+                        fits = too_big - step
+                        break
+                    too_big -= step
+                    step *= 2
+
+        while too_big - fits > 1:
+            middle = (fits + too_big) // 2
+            if self._fits(font, text, width, height, middle):
+                fits = middle
+            else:
+                too_big = middle
 
-    start = return_string.index(start_string)
-    end = return_string.index(end_string, start)
+        # Even if nothing fits, 1 point is the smallest size we can sensibly set
+        return max(fits, 1)
 
-    return_string = return_string[start:end].split('<span class="nowrap">')[4]
-    return_string = return_string[0:return_string.index('<')]
 
-    return return_string
+font_fitter = FontFitter()
 
 
-# This isn't a very neat solution to the problem, but it was the only solution that I found that worked consistently
-# Set the fontsize to a max size, then keep decreasing it until the bounding box of the text is within the bounding
-# box of the label
+# Set the font size of the label to the largest size where the bounding box of the text is within the bounding box of
+# the label
 def fit_text_in_label(label):
-    font = label.font()
-    contents_rect = label.contentsRect()
-    binding_width = contents_rect.width()
-    binding_height = contents_rect.height()
-
-    font_size = 1
-    font.setPointSize(font_size)
-    while font_size < MAX_FONT_SIZE:
-        font_metrics = QtGui.QFontMetrics(font)
-        bounding_rect = font_metrics.boundingRect(label.text())
-
-        if bounding_rect.width() <= binding_width and bounding_rect.height() <= binding_height and font_size:
-            font_size += 1
-            font.setPointSize(font_size)
-        else:
-            break
-
-    label.setFont(font)
-
-
-# Checks the system name against the known naming pattern from a
-def is_wormhole(system_name):
-    if system_name is None:
-        return False
-    # Start of string followed by J followed by any number of integers followed by end of string
-    p = re.compile('^J[0-9]+$')
-    return bool(p.match(system_name))
+    font_fitter.fit(label)
 
 
 # Window opened to choose a new key in the keyBindingWindow
@@ -130,12 +166,14 @@ class ModifyKeyBindWindow(QtWidgets.QDialog):
         self.label = QtWidgets.QLabel("Press any key to add the keybind or ESC to unbind")
         layout.addWidget(self.label)
         self.keyName = None
+        import keyboard
         keyboard.hook(self.update_key)
         self.setWindowTitle('Modify keybind')
         # Need to handle the accept slot with a custom signal otherwise the program hangs
         self.finished.connect(self.accept)
 
     def update_key(self, key_event):
+        import keyboard
         self.keyName = key_event.name
         # There were some issues saving modifiers with which side of the keyboard they were on
         # For instance the keyboard event for 'left shift' won't work in the shortcut, we need it to just be 'shift'
@@ -160,12 +198,13 @@ class ModifyKeyBindWindow(QtWidgets.QDialog):
 
 
 class FeaturesWindow(QtWidgets.QDialog):
-    def __init__(self, settings, parent=None):
+    def __init__(self, settings, sound_bank, parent=None):
         super(FeaturesWindow, self).__init__(parent)
         self.ui = Ui_FeaturesWindow()
         self.ui.setupUi(self)
         self.setWindowTitle('Features')
         self.settings = settings
+        self.sound_bank = sound_bank
         self.ui.checkBoxReminderBookmarkWormhole.stateChanged.connect(self.handle_reminder_bookmark_state)
         self.stopPlayingTimer = QTimer()
         self.stopPlayingTimer.setInterval(100)  # every 100 ms
@@ -179,21 +218,19 @@ class FeaturesWindow(QtWidgets.QDialog):
                                                 Halfticked -> 1
                                                 Ticked -> 2
         We are only interested in the states 0 and 2, so we need to convert the state to a boolean to get the ticked
-        / unticked we are interested in. When reading a string from the QSettings object, this means we cast to an int
-        and then boolean. This is why int(bool(newState)) and bool(int(settings...)) are used so often.
+        / unticked we are interested in. This is why bool(newState) is used so often.
         """
-        # TODO: Wrap QSettings in a wrapper class to make this much nicer
-        self._setup_checkbox(self.ui.checkBoxReminderBookmarkWormhole, 'features/reminderBookmarkWormhole')
-        self._setup_checkbox(self.ui.checkBoxClipboardShortcut, 'features/evePraisalClipboard')
-        self._setup_checkbox(self.ui.checkBoxWormholeTypeKeybind, 'features/wormholeTypeKeycombo')
-        self._setup_checkbox(self.ui.checkBoxPlaySound, 'features/reminderBookmarkWormholeSound')
-        self._setup_checkbox(self.ui.checkBoxFlashText, 'features/reminderBookmarkWormholeFlashText')
-
-        self.ui.checkBoxSaveRefreshToken.setChecked(bool(int(self.settings.value('CREST/saveRefreshToken'))))
+        self._setup_checkbox(self.ui.checkBoxReminderBookmarkWormhole, 'reminder_bookmark_wormhole')
+        self._setup_checkbox(self.ui.checkBoxClipboardShortcut, 'eve_praisal_clipboard')
+        self._setup_checkbox(self.ui.checkBoxWormholeTypeKeybind, 'wormhole_type_keycombo')
+        self._setup_checkbox(self.ui.checkBoxPlaySound, 'reminder_bookmark_wormhole_sound')
+        self._setup_checkbox(self.ui.checkBoxFlashText, 'reminder_bookmark_wormhole_flash_text')
+
+        self.ui.checkBoxSaveRefreshToken.setChecked(self.settings.save_refresh_token)
         self.ui.checkBoxSaveRefreshToken.stateChanged.connect(self.handle_save_refresh_token)
 
         self.ui.pushButtonBrowseSnd.clicked.connect(self.change_sound_path)
-        self.ui.labelSndPath.setText(self.settings.value('sound/path'))
+        self.ui.labelSndPath.setText(self.settings.sound_path)
 
         # Need to manually call this, as if it wasn't checked the content that should be disabled won't be
         self.handle_reminder_bookmark_state(self.ui.checkBoxReminderBookmarkWormhole.checkState())
@@ -222,13 +259,13 @@ class FeaturesWindow(QtWidgets.QDialog):
             msg_box.addButton(QPushButton('Cancel'), QMessageBox.RejectRole)
             msg_box.exec()
             if msg_box.clickedButton() == save_button:
-                self.settings.setValue('CREST/saveRefreshToken', '1')
+                self.settings.set('save_refresh_token', True)
             else:
                 self.ui.checkBoxSaveRefreshToken.setCheckState(Qt.Unchecked)
-                self.settings.setValue('CREST/saveRefreshToken', '0')
+                self.settings.set('save_refresh_token', False)
         else:
-            self.settings.setValue('CREST/refreshToken', '')
-            self.settings.setValue('CREST/saveRefreshToken', '0')
+            self.settings.set('refresh_token', '')
+            self.settings.set('save_refresh_token', False)
 
     # Start playing the sound, or stop it if one is playing
     def start_stop_playing_sound(self, sound_path=None):
@@ -238,11 +275,11 @@ class FeaturesWindow(QtWidgets.QDialog):
                 return 0
 
         if sound_path is None:
-            sound_path = self.settings.value('sound/path')
+            sound_path = self.settings.sound_path
 
         # Play the sound
         try:
-            self.play_object = sa.WaveObject.from_wave_file(sound_path).play()
+            self.play_object = self.sound_bank.play_file(sound_path)
             self.stopPlayingTimer.start()
             self.ui.pushButtonTestSnd.setText("Stop")
         except (wave.Error, FileNotFoundError) as e:
@@ -261,7 +298,7 @@ class FeaturesWindow(QtWidgets.QDialog):
         filename = QFileDialog.getOpenFileName(self, 'New sound file', '.', '*.wav')[0]
         if filename != '':
             if self.start_stop_playing_sound(filename) == 0:  # we played the sound successfully
-                self.settings.setValue('sound/path', filename)
+                self.settings.set('sound_path', filename)
                 self.ui.labelSndPath.setText(filename)
 
     def handle_stop_playing_sound(self):
@@ -269,9 +306,9 @@ class FeaturesWindow(QtWidgets.QDialog):
             if not self.play_object.is_playing():
                 self.ui.pushButtonTestSnd.setText("Play")
 
-    def _setup_checkbox(self, checkbox, value):
-        checkbox.setChecked(bool(int(self.settings.value(value))))
-        checkbox.stateChanged.connect(lambda newState: self.settings.setValue(value, int(bool(newState))))
+    def _setup_checkbox(self, checkbox, attribute):
+        checkbox.setChecked(getattr(self.settings, attribute))
+        checkbox.stateChanged.connect(lambda newState: self.settings.set(attribute, bool(newState)))
 
 
 # Window to modify the key binding to analyse the clipboard
@@ -327,6 +364,22 @@ class KeyBindingDialog(QtWidgets.QDialog):
         return self.new_key_combo
 
 
+# Portraits come from the CREST handler as image bytes, as it runs without a GUI. Each one is only decoded once
+_portrait_pixmaps = {}
+
+
+def portrait_pixmap(portrait, size=128):
+    if portrait is None:
+        pixmap = QtGui.QPixmap(size, size)
+        pixmap.fill(QtGui.QColor(0, 0, 0))
+        return pixmap
+    if portrait not in _portrait_pixmaps:
+        image = QtGui.QImage()
+        image.loadFromData(portrait)
+        _portrait_pixmaps[portrait] = QtGui.QPixmap(image)
+    return _portrait_pixmaps[portrait]
+
+
 # Window to handle CREST SSO and show status
 class CRESTWindow(QtWidgets.QDialog):
     def __init__(self, CREST_handler, parent=None):
@@ -335,35 +388,46 @@ class CRESTWindow(QtWidgets.QDialog):
         self.CREST_handler = CREST_handler
         self.setWindowTitle('CREST Information')
         self.begin_sso_auth.connect(self.CREST_handler.sso_auth)
-        self.CREST_handler.charactor_information_updated.connect(self.update_UI)
-        self.CREST_handler.new_char_location.connect(self.update_location)
+        # The handler emits these on its worker thread
+        self.CREST_handler.charactor_information_updated.connect(self.update_UI, Qt.QueuedConnection)
+        self.CREST_handler.new_char_location.connect(self.update_location, Qt.QueuedConnection)
+        self.CREST_handler.character_location_changed.connect(self.update_other_characters, Qt.QueuedConnection)
         self.btn = QtWidgets.QPushButton()
+        # Logs in another character alongside the ones we already have
+        self.btnAddCharacter = QtWidgets.QPushButton("Add character")
+        self.btnAddCharacter.pressed.connect(self.begin_sso_auth.emit)
         if self.CREST_handler.status == self.CREST_handler.Statuses.obtaining_public_endpoints or self.CREST_handler.status == self.CREST_handler.Statuses.waiting_for_credentials:
             self.btn.setText("Start SSO")
             self.btn.pressed.connect(self.begin_sso_auth.emit)
+            self.btnAddCharacter.setEnabled(False)
         else:
             self.btn.setText("Logout")
             self.btn.pressed.connect(self.CREST_handler.logout)
 
         self.charImage = QtWidgets.QLabel()
-        self.charImage.setPixmap(self.CREST_handler.get_character_portrait())
+        self.charImage.setPixmap(portrait_pixmap(self.CREST_handler.get_character_portrait()))
 
         self.charNameLabel = QtWidgets.QLabel(self.CREST_handler.get_character_name())
         self.charNameLabel.setAlignment(Qt.AlignCenter)
         self.charLocationLabel = QtWidgets.QLabel(self.CREST_handler.get_character_position())
         self.charLocationLabel.setAlignment(Qt.AlignCenter)
+        self.otherCharactersLabel = QtWidgets.QLabel()
+        self.otherCharactersLabel.setAlignment(Qt.AlignCenter)
+        self.update_other_characters()
 
         self.labelStatus = QtWidgets.QLabel()
         status = self.CREST_handler.get_status()
         if status is not None:
             self.labelStatus.setText(status.value)
-        self.CREST_handler.status_updated.connect(lambda status: self.labelStatus.setText(status.value))
+        self.CREST_handler.status_updated.connect(self.update_status, Qt.QueuedConnection)
 
         layout = QtWidgets.QVBoxLayout()
         layout.addWidget(self.charImage, alignment=Qt.AlignCenter)
         layout.addWidget(self.charNameLabel, alignment=Qt.AlignCenter)
         layout.addWidget(self.charLocationLabel, alignment=Qt.AlignCenter)
+        layout.addWidget(self.otherCharactersLabel, alignment=Qt.AlignCenter)
         layout.addWidget(self.btn, alignment=Qt.AlignCenter)
+        layout.addWidget(self.btnAddCharacter, alignment=Qt.AlignCenter)
         layout.addWidget(self.labelStatus, alignment=Qt.AlignCenter)
 
         self.setLayout(layout)
@@ -373,21 +437,34 @@ class CRESTWindow(QtWidgets.QDialog):
     def update_location(self, new_position):
         self.charLocationLabel.setText(new_position)
 
+    def update_status(self, status):
+        self.labelStatus.setText(status.value)
+
+    # Lists where every character other than the main one is
+    def update_other_characters(self, name=None, new_position=None):
+        # The first is the main character
+        others = list(self.CREST_handler.get_character_positions().values())[1:]
+        self.otherCharactersLabel.setText('\n'.join((character or 'No character') + ': ' + position
+                                                    for character, position in sorted(others, key=str)))
+
     @pyqtSlot(str, object)
     def update_UI(self, name, portrait):
-        self.charImage.setPixmap(portrait)
+        self.charImage.setPixmap(portrait_pixmap(portrait))
         self.charNameLabel.setText(name)
 
         if self.CREST_handler.get_status() == self.CREST_handler.Statuses.connected:
             self.btn.setText("Logout")
             self.btn.disconnect()
             self.btn.pressed.connect(self.CREST_handler.logout)
+            self.btnAddCharacter.setEnabled(True)
         else:
             self.btn.setText("Start SSO")
             self.charLocationLabel.setText("No position")
             self.charNameLabel.setText("No character")
             self.btn.disconnect()
             self.btn.pressed.connect(self.begin_sso_auth.emit)
+            self.btnAddCharacter.setEnabled(False)
+        self.update_other_characters()
 
     send_credentials = pyqtSignal(str, str, str)
     begin_sso_auth = pyqtSignal()
@@ -410,8 +487,13 @@ class MainWindow(QtWidgets.QMainWindow):
         self.key_bind_window = None
         self.features_window = None
         self.CREST_window = None
-        self.old_location = None
         self.refreshToken = None
+        # Everything that doesn't need the window, created in start_subsystems
+        self.core = None
+        # These are emitted from other threads, and handled on the GUI thread
+        self.wormhole_code_typed.connect(self.update_label_text, Qt.QueuedConnection)
+        self.appraisal_finished.connect(self.handle_appraisal_finished, Qt.QueuedConnection)
+        self.appraisal_failed.connect(self.handle_appraisal_failed, Qt.QueuedConnection)
 
         self.blink_text_timer = QTimer()
         self.blink_text_timer.timeout.connect(self.blink_main_text)
@@ -420,41 +502,79 @@ class MainWindow(QtWidgets.QMainWindow):
         self.blink_text_flashes_left = 0
 
         # Read the settings from the settings.ini file
-        system_location = os.path.dirname(os.path.abspath(sys.argv[0]))
-        QSettings.setPath(QSettings.IniFormat, QSettings.SystemScope, system_location)
-        self.settings = QSettings("settings.ini", QSettings.IniFormat)
-        if os.path.exists(system_location + "/settings.ini"):
-            print("Loading settings from " + system_location + "/settings.ini")
+        self.system_location = os.path.dirname(os.path.abspath(sys.argv[0]))
+        self.settings = Settings("settings.ini")
+        if os.path.exists(self.system_location + "/settings.ini"):
+            print("Loading settings from " + self.system_location + "/settings.ini")
         else:
             print("Unable to read settings.ini, creating new default settings.ini ...")
-            write_default_settings(self.settings)
-        self.global_keyCombo = self.settings.value('main/shortcut')
-        CREST_client_id = self.settings.value('CREST/client_id')
-        CREST_secret = self.settings.value('CREST/secret')
-        refresh_token = self.settings.value('CREST/refreshToken')
-
-        keyboard.add_hotkey(self.global_keyCombo, self.analyse_clipboard_text)
-        # Turn the wormhole name into a hotkey deceleration (commas between each letter) and then attach it to
-        # the update_label_text function
-        if bool(int(self.settings.value('features/wormholeTypeKeycombo'))):
-            self.handle_keybinds('wormholes.csv')
-
-        try:
-            self.port = int(self.settings.value('network/port'))
-        except TypeError:
-            self.port = 4173
-
-        if CREST_client_id != '' and CREST_secret != '':
-            self.CREST_handler = EveCRESTHandler(port=self.port)
-            self.CREST_handler.status_updated.connect(self.handle_CREST_handler_status_update)
-            self.CREST_handler.new_char_location.connect(self.handle_new_position)
-            self.CREST_handler.new_refresh_token.connect(self.received_new_refresh_token)
+            self.settings.write_defaults()
+        self.global_keyCombo = self.settings.shortcut
+        self.port = self.settings.port
+        self.CREST_handler = None
+        self.first_location_seen = False
+        # The hotkey fires on the keyboard library's hook thread, so it only emits a signal and the clipboard is read
+        # back on the GUI thread
+        self.clipboard_shortcut_pressed.connect(self.analyse_clipboard_text, Qt.QueuedConnection)
+
+        log_startup_stage('UI built')
+        self.show()
+        log_startup_stage('window shown')
+        # Everything else is started once the event loop is running, so the window is drawn first
+        QTimer.singleShot(0, self.start_subsystems)
+
+    def start_subsystems(self):
+        self.core = ExploCore(self.settings, self.system_location)
+        # Saves anything the core is still holding on to, like the last few changes to the wormhole chain
+        QtWidgets.QApplication.instance().aboutToQuit.connect(self.core.close)
+        self.core.subscribe(ExploCore.Events.bookmark_reminder, self.reminder_to_bookmark_wormhole)
+        self.core.subscribe(ExploCore.Events.status, self.statusBar().showMessage)
+        # Key presses come in on the keyboard library's hook thread, so the label is updated through a signal to stay
+        # on the GUI thread
+        self.core.subscribe(ExploCore.Events.wormhole_type, lambda wh_type: self.wormhole_code_typed.emit(
+            wh_type.describe()))
+        # Appraisals are reported on the appraisal handler's thread, so they're passed back through signals too
+        self.core.subscribe(ExploCore.Events.appraisal_finished, self.appraisal_finished.emit)
+        self.core.subscribe(ExploCore.Events.appraisal_failed, self.appraisal_failed.emit)
+        log_startup_stage('core')
+
+        # Keyboard is MIT licenced
+        import keyboard
+        keyboard.add_hotkey(self.global_keyCombo, self.clipboard_shortcut_pressed.emit)
+        # Watch every key press for wormhole names and show what type they are through update_label_text
+        if self.settings.wormhole_type_keycombo:
+            self.handle_keybinds(WORMHOLE_TYPES_FILE)
+        # Edits to the wormhole types are picked up without a restart
+        self.wormhole_types_file = WatchedFile(WORMHOLE_TYPES_FILE, self)
+        self.wormhole_types_file.changed.connect(self.reload_wormhole_types)
+        log_startup_stage('hotkeys')
+
+        if self.settings.crest_client_id != '' and self.settings.crest_secret != '':
+            from EveCRESTHandler import EveCRESTHandler
+            self.CREST_handler = EveCRESTHandler(port=self.port,
+                                                 portrait_cache_dir=self.system_location + '/portraits',
+                                                 endpoint_cache_path=self.system_location + '/endpoint_cache.json')
+            # The handler emits these on its worker thread. They're queued to our own slots so the core, and so
+            # everything it calls back, only ever runs on the GUI thread
+            self.CREST_handler.status_updated.connect(self.handle_CREST_handler_status_update, Qt.QueuedConnection)
+            self.CREST_handler.character_location_changed.connect(self.handle_new_position, Qt.QueuedConnection)
+            self.CREST_handler.new_char_location.connect(self.handle_new_primary_position, Qt.QueuedConnection)
+            self.CREST_handler.new_refresh_token.connect(self.received_new_refresh_token, Qt.QueuedConnection)
             self.send_credentials.connect(self.CREST_handler.setup)
-            self.send_credentials.emit(CREST_client_id, CREST_secret, refresh_token)
+            self.send_credentials.emit(self.settings.crest_client_id, self.settings.crest_secret,
+                                       self.settings.refresh_token)
             self.ui.actionCREST.triggered.connect(self.open_CREST_window)
+            log_startup_stage('CREST started')
         else:
             self.ui.actionCREST.setEnabled(False)
-        self.show()
+
+        # Only the paths are set here, each sound is decoded the first time it's played
+        from SoundBank import SoundBank
+        self.sound_bank = SoundBank()
+        self.load_sounds()
+
+        # Only listen for changes once everything that reacts to them exists
+        self.settings.changed.connect(self.handle_setting_changed)
 
     # TODO: Stop the border blinking along with the text. Honestly I'd rather get rid of the border,
     # but it makes the text fit inside the bounds better, so that would need to be looked at
@@ -468,82 +588,127 @@ class MainWindow(QtWidgets.QMainWindow):
             self.blink_text_timer.stop()
             self.ui.labelMain.show()  # Make sure it's visible now that the blinking has stopped
 
-    # Yes I know there are many python libraries that read csv's better than this, and csv's are complicated to read
-    # However this is a very simple csv, so there is no point dragging in extra dependencies for this
+    # Rather than a hotkey per wormhole type, a single keyboard hook feeds every key press into a trie of the wormhole
+    # names, so binding and unbinding is just one hook / unhook
     def handle_keybinds(self, filepath, unbind=False):
-        with open(filepath) as f:
-            for line in f:
-                if line != '':
-                    wh_name = line.split(',')[0]
-                    wh_type = line.split(',')[1]
-                    if unbind:
-                        keyboard.remove_hotkey(",".join(wh_name))
-                    else:
-                        keyboard.add_hotkey(",".join(wh_name), self.update_label_text, args=[wh_type])
+        import keyboard
+        if unbind:
+            keyboard.unhook(self.handle_wormhole_key_event)
+        else:
+            self.core.load_wormhole_types(filepath)
+            keyboard.hook(self.handle_wormhole_key_event)
+
+    # Only the wormhole types that were added, removed or changed are updated in the core's matcher
+    def reload_wormhole_types(self, filepath):
+        self.core.reload_wormhole_types(filepath)
+
+    # Called from the keyboard library's hook thread
+    def handle_wormhole_key_event(self, event):
+        import keyboard
+        if event.event_type != keyboard.KEY_DOWN or event.name is None or event.name in keyboard.all_modifiers:
+            return
+        # Space, enter, backspace etc. all break up a wormhole name
+        self.core.handle_key(event.name if len(event.name) == 1 else None, event.time)
 
     def analyse_clipboard_text(self):
-        if bool(int(self.settings.value('features/evePraisalClipboard'))):
+        if self.settings.eve_praisal_clipboard:
             clipboard = QtGui.QGuiApplication.clipboard()
             clipboard_text = clipboard.text().strip()
             print(clipboard_text)
-            estimate = get_price_estimate(clipboard_text)
-            GUI.ui.labelMain.setText(estimate + " isk")
+            self.core.appraise(clipboard_text)
 
-        fit_text_in_label(GUI.ui.labelMain)
+    def handle_appraisal_finished(self, appraisal):
+        from EvePraisalHandler import format_isk
+        self.ui.labelMain.setText(format_isk(appraisal.sell) + " isk")
+        fit_text_in_label(self.ui.labelMain)
+        self.sound_bank.play(self.sound_bank.Events.appraisal_done)
 
-    def reminder_to_bookmark_wormhole(self):
-        if bool(int(self.settings.value('features/reminderBookmarkWormholeFlashText'))):
+    def handle_appraisal_failed(self, error):
+        self.ui.labelMain.setText("Appraisal failed")
+        fit_text_in_label(self.ui.labelMain)
+
+    # (Re)sets the sound for each event from the settings. Files that are already loaded aren't read again
+    def load_sounds(self):
+        events = self.sound_bank.Events
+        bookmark_sound = self.settings.sound_path
+        for event, path in ((events.enter_wormhole, self.settings.sound_enter_wormhole or bookmark_sound),
+                            (events.leave_wormhole, self.settings.sound_leave_wormhole or bookmark_sound),
+                            (events.appraisal_done, self.settings.sound_appraisal_done)):
+            self.sound_bank.set_sound(event, path)
+
+    def reminder_to_bookmark_wormhole(self, character, entering_wormhole, triggered_at=None):
+        if self.settings.reminder_bookmark_wormhole_flash_text:
             self.blink_text_flashes_left = self.blink_text_number
-            GUI.ui.labelMain.setText('BOOKMARK THE HOLE')
+            self.ui.labelMain.setText('BOOKMARK THE HOLE')
             self.blink_text_timer.start()
-            fit_text_in_label(GUI.ui.labelMain)
-        if bool(int(self.settings.value('features/reminderBookmarkWormholeSound'))):
-            try:
-                wave_obj = sa.WaveObject.from_wave_file(self.settings.value('sound/path'))
-                wave_obj.play()
-            except (wave.Error, FileNotFoundError):
-                # We won't crash on an error, but errors are more rigorously handled and reported to the user if they test
-                # in the options menu. I don't really want to pop a dialog up here as the user has just jumped into a
-                # wormhole, so it's a bad time to have to deal with other dialog menus, maybe even minimising Eve.
-                pass
-
-    def handle_new_position(self, new_pos):
-        if (is_wormhole(self.old_location) and new_pos != "Offline") \
-                or (is_wormhole(new_pos) and self.old_location != "No position" and self.old_location != "Offline") and \
-                        bool(int(self.settings.value('features/reminderBookmarkWormhole'))):
-            self.reminder_to_bookmark_wormhole()
-        self.old_location = new_pos
+            fit_text_in_label(self.ui.labelMain)
+        if self.settings.reminder_bookmark_wormhole_sound:
+            # A sound that fails to load just isn't played. Errors are more rigorously handled and reported to the user
+            # if they test in the options menu. I don't really want to pop a dialog up here as the user has just jumped
+            # into a wormhole, so it's a bad time to have to deal with other dialog menus, maybe even minimising Eve.
+            self.sound_bank.play(self.sound_bank.Events.enter_wormhole if entering_wormhole
+                                 else self.sound_bank.Events.leave_wormhole, triggered_at)
+
+    @pyqtSlot(str, str)
+    def handle_new_position(self, character, new_pos):
+        if not self.first_location_seen:
+            self.first_location_seen = True
+            log_startup_stage('first location')
+        self.core.handle_location(character, new_pos)
+
+    @pyqtSlot(str)
+    def handle_new_primary_position(self, new_pos):
+        self.core.handle_primary_location(new_pos)
 
     def open_key_bind_window(self):
         self.key_bind_window = KeyBindingDialog(self.global_keyCombo, parent=self)
         if self.key_bind_window.exec():
-            new_key_combo = self.key_bind_window.get_new_key_combo()
-            keyboard.remove_hotkey(self.global_keyCombo)
-            keyboard.add_hotkey(new_key_combo, self.analyse_clipboard_text)
-            self.settings.setValue('main/shortcut', new_key_combo)
-            self.global_keyCombo = new_key_combo
+            # The hotkey itself is changed over in handle_setting_changed
+            self.settings.set('shortcut', self.key_bind_window.get_new_key_combo())
 
     def open_CREST_window(self):
         self.CREST_window = CRESTWindow(self.CREST_handler, parent=self)
 
+    # Everything the features window changes takes effect straight away through handle_setting_changed
     def open_features_window(self):
-        old_keybind_setting = bool(int(self.settings.value('features/wormholeTypeKeycombo')))
-        self.features_window = FeaturesWindow(settings=self.settings, parent=self)
-        if self.features_window.exec():
-            # We need to set / unset the keybinds if the setting was changed
-            new_keybind_setting = bool(int(self.settings.value('features/wormholeTypeKeycombo')))
-            if old_keybind_setting != new_keybind_setting:
-                self.handle_keybinds('wormholes.csv', unbind=old_keybind_setting)
-            if bool(int(self.settings.value('CREST/saveRefreshToken'))):
+        self.features_window = FeaturesWindow(settings=self.settings, sound_bank=self.sound_bank, parent=self)
+        self.features_window.exec()
+
+    # Called whenever a setting changes, from the program or from settings.ini being edited, so only what depends on
+    # that setting is redone
+    def handle_setting_changed(self, attribute, value):
+        if attribute == 'shortcut':
+            import keyboard
+            keyboard.remove_hotkey(self.global_keyCombo)
+            try:
+                keyboard.add_hotkey(value, self.clipboard_shortcut_pressed.emit)
+                self.global_keyCombo = value
+            except ValueError as e:
+                # Most likely a typo in a hand edited settings.ini, so keep the old hotkey working
+                print(e)
+                print('Unable to bind ' + value + ', keeping ' + self.global_keyCombo)
+                keyboard.add_hotkey(self.global_keyCombo, self.clipboard_shortcut_pressed.emit)
+        elif attribute == 'wormhole_type_keycombo':
+            self.handle_keybinds(WORMHOLE_TYPES_FILE, unbind=not value)
+        elif attribute in ('sound_path', 'sound_enter_wormhole', 'sound_leave_wormhole', 'sound_appraisal_done'):
+            self.load_sounds()
+        elif attribute == 'save_refresh_token':
+            if value:
                 if self.refreshToken is not None:
-                    self.settings.setValue('CREST/refreshToken', self.refreshToken)
+                    self.settings.set('refresh_token', self.refreshToken)
             else:
-                self.settings.setValue('CREST/refreshToken', '')
+                self.settings.set('refresh_token', '')
+        elif attribute == 'home':
+            self.core.set_home(value)
+        elif attribute == 'chain_edge_lifetime':
+            self.core.wormhole_chain.max_edge_age = value
+        elif attribute in RESTART_REQUIRED_SETTINGS:
+            print('The new ' + attribute + ' setting will be used the next time the program starts')
 
     def received_new_refresh_token(self, token):
         self.refreshToken = token
-        if bool(int(self.settings.value('CREST/saveRefreshToken'))):
-            self.settings.setValue('CREST/refreshToken', self.refreshToken)
+        if self.settings.save_refresh_token:
+            self.settings.set('refresh_token', self.refreshToken)
 
     def update_label_text(self, text):
         self.ui.labelMain.setText(text)
@@ -564,9 +729,15 @@ class MainWindow(QtWidgets.QMainWindow):
         QtWidgets.QMainWindow.resizeEvent(self, evt)
 
     send_credentials = pyqtSignal(str, str, str)
-
-
-app = QtWidgets.QApplication(sys.argv)
-GUI = MainWindow()
-GUI.resize(700, 100)  # Trigger the resize to set the right font size
-sys.exit(app.exec())
+    wormhole_code_typed = pyqtSignal(str)
+    clipboard_shortcut_pressed = pyqtSignal()
+    appraisal_finished = pyqtSignal(object)
+    appraisal_failed = pyqtSignal(object)
+
+
+if __name__ == '__main__':
+    log_startup_stage('imports')
+    app = QtWidgets.QApplication(sys.argv)
+    GUI = MainWindow()
+    GUI.resize(700, 100)  # Trigger the resize to set the right font size
+    sys.exit(app.exec())
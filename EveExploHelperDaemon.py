@@ -0,0 +1,118 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Runs the location tracking without a window, printing jumps, bookmark reminders and where the main character is to
+# the console. Useful on a spare machine with no display. It uses the same settings.ini as the window, and needs a
+# saved refresh token (tick "Save refresh token" in Options > Features after logging in with the window once)
+
+# PyQt is GPL v3
+from PyQt5.QtCore import QCoreApplication, QObject, QTimer, Qt, pyqtSignal, pyqtSlot
+# Python standard library is PSF licenced
+from datetime import datetime
+import os
+import signal
+import sys
+# Other files from this project, GPL v3 licenced
+from EveCRESTHandler import EveCRESTHandler
+from ExploCore import ExploCore
+from Settings import Settings
+
+
+class Daemon(QObject):
+    """
+    Headless client of ExploCore, fed by the CREST handler, that prints everything the core reports.
+    """
+
+    def __init__(self, settings, data_dir, parent=None):
+        super(Daemon, self).__init__(parent)
+        self.settings = settings
+        self.core = ExploCore(settings, data_dir)
+        self.core.subscribe(ExploCore.Events.jump, self.print_jump)
+        self.core.subscribe(ExploCore.Events.bookmark_reminder, self.print_bookmark_reminder)
+        self.core.subscribe(ExploCore.Events.status, lambda status: self.log(status))
+
+        self.CREST_handler = EveCRESTHandler(port=settings.port, portrait_cache_dir=data_dir + '/portraits',
+                                             endpoint_cache_path=data_dir + '/endpoint_cache.json')
+        # The handler emits these on its worker thread. They're queued to our own slots so the core only ever runs on
+        # the main thread
+        self.CREST_handler.status_updated.connect(self.print_CREST_status, Qt.QueuedConnection)
+        self.CREST_handler.character_location_changed.connect(self.handle_new_position, Qt.QueuedConnection)
+        self.CREST_handler.new_char_location.connect(self.handle_new_primary_position, Qt.QueuedConnection)
+        self.CREST_handler.new_refresh_token.connect(self.received_new_refresh_token, Qt.QueuedConnection)
+        self.send_credentials.connect(self.CREST_handler.setup)
+
+    def start(self):
+        self.send_credentials.emit(self.settings.crest_client_id, self.settings.crest_secret,
+                                   self.settings.refresh_token)
+
+    def log(self, text):
+        print(datetime.now().strftime('%H:%M:%S') + ' ' + text)
+
+    @pyqtSlot(str, str)
+    def handle_new_position(self, character, new_pos):
+        self.core.handle_location(character, new_pos)
+
+    @pyqtSlot(str)
+    def handle_new_primary_position(self, new_pos):
+        self.core.handle_primary_location(new_pos)
+
+    def print_CREST_status(self, status):
+        self.log('CREST status: ' + status.value)
+
+    def print_jump(self, jump):
+        if jump.from_system is None:
+            self.log(jump.character + ' is in ' + jump.to_system)
+        else:
+            self.log(jump.character + ': ' + jump.from_system + ' -> ' + jump.to_system)
+
+    def print_bookmark_reminder(self, character, entering_wormhole, triggered_at=None):
+        self.log(character + ': BOOKMARK THE HOLE')
+
+    def received_new_refresh_token(self, token):
+        if self.settings.save_refresh_token:
+            self.settings.set('refresh_token', token)
+
+    def close(self):
+        self.settings.flush()
+        self.core.close()
+
+    send_credentials = pyqtSignal(str, str, str)
+
+
+def main():
+    app = QCoreApplication(sys.argv)
+    system_location = os.path.dirname(os.path.abspath(sys.argv[0]))
+    settings = Settings(os.path.join(system_location, 'settings.ini'))
+    if settings.crest_client_id == '' or settings.crest_secret == '' or settings.refresh_token == '':
+        print('CREST client_id, secret and a saved refresh token are needed in settings.ini to run without a window')
+        return 1
+
+    daemon = Daemon(settings, system_location)
+    # Qt doesn't give Python a chance to handle ctrl+c while it is waiting for events, so wake it up now and again
+    signal.signal(signal.SIGINT, lambda *args: app.quit())
+    wake_timer = QTimer()
+    wake_timer.timeout.connect(lambda: None)
+    wake_timer.start(500)
+    app.aboutToQuit.connect(daemon.close)
+    daemon.start()
+    return app.exec()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,362 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Requests is apache 2.0 licenced
+import requests
+# PyQt is GPL v3
+from PyQt5.QtCore import QThread, pyqtSignal, QObject, pyqtSlot
+# Python standard library is PSF licenced
+from array import array
+from collections import OrderedDict, namedtuple
+from enum import Enum
+from hashlib import sha1
+from html.parser import HTMLParser
+from operator import mul
+from time import time
+import json
+import re
+# Other files from this project, GPL v3 licenced
+from FileUtils import atomic_write
+
+
+# Turns a paste into {item name: quantity}. Pastes copied from in game windows are tab separated with the quantity in
+# the second column; anything else is counted as one item per line
+def parse_paste(content):
+    items = {}
+    for line in content.splitlines():
+        columns = line.split('\t')
+        name = ' '.join(columns[0].split())
+        if name == '':
+            continue
+        quantity = 1
+        if len(columns) > 1:
+            # Quantities may have thousands separators depending on the client's language settings
+            digits = ''.join(columns[1].split()).replace(',', '').replace('.', '')
+            if digits.isdigit():
+                quantity = int(digits)
+        items[name] = items.get(name, 0) + quantity
+    return items
+
+
+# The same loot copied twice can come out in a different order, or with the same item split over several stacks, so
+# the paste is reduced to sorted item / quantity lines before it is used as a cache key
+def normalise_paste(content):
+    items = parse_paste(content)
+    return '\n'.join('{}\t{}'.format(name, items[name]) for name in sorted(items))
+
+
+class AppraisalCache(object):
+    """
+    Remembers recent appraisals, keyed on the normalised paste, so pressing the shortcut again on the same can doesn't
+    go back to evepraisal. Entries expire after ttl seconds, only the max_entries most recently used are kept, and the
+    cache is saved to disk so it survives a restart.
+    """
+
+    def __init__(self, path=None, ttl=3600, max_entries=200):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (time stored, Appraisal), least recently used first
+        self._entries = OrderedDict()
+        if self.path is not None:
+            self.load()
+
+    @staticmethod
+    def key_for(content):
+        return sha1(normalise_paste(content).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time() - entry[0] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, appraisal):
+        self._entries[key] = (time(), appraisal)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.save()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            # Missing or corrupt cache, we'll just start from empty
+            return
+        if not isinstance(entries, list):
+            return
+        now = time()
+        for entry in entries[-self.max_entries:]:
+            # Anything not shaped like what save() writes is from an older version of the cache, or damaged, and dropped
+            if not isinstance(entry, list) or len(entry) != 3:
+                continue
+            key, stored, appraisal = entry
+            if not isinstance(key, str) or not isinstance(stored, (int, float)) or \
+                    not isinstance(appraisal, list) or len(appraisal) != len(Appraisal._fields):
+                continue
+            if now - stored <= self.ttl:
+                self._entries[key] = (stored, Appraisal(*appraisal))
+
+    def save(self):
+        if self.path is None:
+            return
+        try:
+            atomic_write(self.path, json.dumps([[key, stored, list(appraisal)]
+                                                for key, (stored, appraisal) in self._entries.items()]))
+        except OSError as e:
+            print(e)
+            print('Unable to save the appraisal cache')
+
+
+class PriceTable(object):
+    """
+    Local Jita prices for offline appraisals, loaded from a snapshot csv with a Name,Buy,Sell header and one item per
+    line. Prices live in two flat arrays of doubles with a dictionary from the lower case item name to its row, so a
+    whole paste is priced by gathering the rows and summing price * quantity across them in one pass.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = {}
+        self.buy = array('d')
+        self.sell = array('d')
+        self.load()
+
+    def load(self):
+        with open(self.path) as f:
+            next(f, None)  # Skip the header row
+            for line in f:
+                line = line.strip()
+                if line == '':
+                    continue
+                # Split from the right as a handful of item names have commas in them
+                name, buy, sell = line.rsplit(',', 2)
+                self.rows[name.lower()] = len(self.buy)
+                self.buy.append(float(buy))
+                self.sell.append(float(sell))
+
+    # Returns the (sell, buy) totals for {item name: quantity}, along with a list of any items we have no price for
+    def estimate(self, items):
+        rows = []
+        quantities = []
+        unknown = []
+        for name, quantity in items.items():
+            row = self.rows.get(name.lower())
+            if row is None:
+                unknown.append(name)
+            else:
+                rows.append(row)
+                quantities.append(quantity)
+        sell = sum(map(mul, [self.sell[row] for row in rows], quantities))
+        buy = sum(map(mul, [self.buy[row] for row in rows], quantities))
+        return sell, buy, unknown
+
+
+# Result of an appraisal. sell and buy are the Jita totals in isk, volume is in m3. Anything the backend couldn't tell
+# us is None
+Appraisal = namedtuple('Appraisal', ['sell', 'buy', 'volume'])
+
+
+# Formats an isk value the same way evepraisal does
+def format_isk(value):
+    return '{:,.2f}'.format(value)
+
+
+# Get's a price estimate from evepraisal. The structured json endpoint is tried first, falling back to scraping the
+# totals out of the html estimate page if that fails
+def get_price_estimate(content, timeout=10):
+    try:
+        return _get_json_price_estimate(content, timeout)
+    except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+        print(e)
+        print('evepraisal json estimate failed, falling back to the html estimate page')
+    return _get_html_price_estimate(content, timeout)
+
+
+def _get_json_price_estimate(content, timeout):
+    r = requests.post('https://evepraisal.com/appraisal.json', params={'market': 'jita', 'persist': 'no'},
+                      data={'raw_textarea': content}, timeout=timeout)
+    r.raise_for_status()
+    totals = r.json()['appraisal']['totals']
+    return Appraisal(sell=float(totals['sell']), buy=float(totals['buy']), volume=float(totals['volume']))
+
+
+def _get_html_price_estimate(content, timeout):
+    r = requests.post('http://evepraisal.com/estimate', data={'raw_paste': content,
+                                                              'hide_buttons': "false",
+                                                              'paste_autosubmit': "false",
+                                                              'market': "30000142",  # Jita
+                                                              'save': "false"},
+                      timeout=timeout, stream=True)
+    r.raise_for_status()
+    if r.encoding is None:
+        r.encoding = 'utf-8'
+
+    # The page is fed to the parser as it arrives, and we stop reading as soon as it has found the totals
+    parser = _EstimateTotalsParser()
+    try:
+        for chunk in r.iter_content(chunk_size=8192, decode_unicode=True):
+            parser.feed(chunk)
+            if parser.done:
+                break
+    finally:
+        r.close()
+    return parser.get_appraisal()
+
+
+# Strips everything but the number out of strings like '1,234.56' or '12.5 m3'
+def _parse_number(text):
+    return float(re.sub(r'[^0-9.]', '', text.split(' ')[0]))
+
+
+class _EstimateTotalsParser(HTMLParser):
+    """
+    Picks the totals out of the evepraisal estimate page. The totals cell is a run of <span class="nowrap"> elements,
+    the labels (Total Sell Value, Total Buy Value, Total Volume) followed by their values in the same order.
+    """
+
+    def __init__(self):
+        super(_EstimateTotalsParser, self).__init__()
+        # Text of the nowrap spans, starting from the Total Sell Value label
+        self.spans = []
+        self.done = False
+        self._span_text = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'span' and ('class', 'nowrap') in attrs:
+            self._span_text = []
+
+    def handle_data(self, data):
+        if self._span_text is not None:
+            self._span_text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'span' and self._span_text is not None:
+            text = ''.join(self._span_text).strip()
+            self._span_text = None
+            if self.spans or text == 'Total Sell Value':
+                self.spans.append(text)
+                self.done = len(self.spans) == 6
+        elif tag == 'th' and self.spans:
+            # The end of the totals cell
+            self.done = True
+
+    def get_appraisal(self):
+        if len(self.spans) < 4:
+            raise ValueError('Unable to find the total sell value in the evepraisal response')
+        values = dict(zip(self.spans[0:3], self.spans[3:6]))
+        buy = values.get('Total Buy Value')
+        volume = values.get('Total Volume')
+        return Appraisal(sell=_parse_number(self.spans[3]),
+                         buy=_parse_number(buy) if buy is not None else None,
+                         volume=_parse_number(volume) if volume is not None else None)
+
+
+class EvePraisalHandler(QObject):
+    """
+    Runs appraisals on a worker thread of their own, so a slow response from evepraisal never holds up the keyboard
+    hook thread (and with it every other global hotkey) or the GUI. Requests are queued to the worker through a signal
+    and results come back the same way. Every request is numbered, and anything older than the latest paste is
+    dropped before it is sent, and its result discarded if it was already in flight. Results are cached (see
+    AppraisalCache) so repeated pastes are answered without a request at all. Alternatively the local backend prices
+    pastes from a PriceTable snapshot without touching the network.
+    """
+
+    def __init__(self, cache_path=None, cache_ttl=3600, cache_size=200, backend='evepraisal', price_snapshot_path=None,
+                 parent=None):
+        super(EvePraisalHandler, self).__init__(parent)
+
+        self.worker_thread = QThread()
+        self.moveToThread(self.worker_thread)
+        self.worker_thread.start()
+
+        self.http_timeout = 10  # seconds before assuming http connection has timed out
+        self._latest_request_id = 0
+        self.cache = AppraisalCache(cache_path, ttl=cache_ttl, max_entries=cache_size)
+        try:
+            self.backend = self.Backends(backend)
+        except ValueError:
+            print('Unknown appraisal backend ' + str(backend) + ', using evepraisal')
+            self.backend = self.Backends.evepraisal
+        self.price_snapshot_path = price_snapshot_path
+        # Loaded on the worker thread the first time it's needed
+        self.price_table = None
+        self._appraisal_queued.connect(self._appraise)
+
+    class Backends(Enum):
+        # The string here is the value used for appraisal/backend in the settings
+        evepraisal = 'evepraisal'
+        local = 'local'
+
+    # Safe to call from any thread. The appraisal itself happens later on the worker thread
+    def request_appraisal(self, content):
+        self._latest_request_id += 1
+        self._appraisal_queued.emit(self._latest_request_id, content)
+
+    @pyqtSlot(int, str)
+    def _appraise(self, request_id, content):
+        if request_id != self._latest_request_id:
+            # A newer paste has come in since this one was queued, no point asking about this one
+            return
+        if self.backend == self.Backends.local:
+            self._appraise_locally(content)
+            return
+
+        cache_key = self.cache.key_for(content)
+        appraisal = self.cache.get(cache_key)
+        if appraisal is not None:
+            self.appraisal_finished.emit(appraisal)
+            return
+
+        try:
+            appraisal = get_price_estimate(content, timeout=self.http_timeout)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(e)
+            print('Unable to get a price estimate from evepraisal')
+            if request_id == self._latest_request_id:
+                self.appraisal_failed.emit(str(e))
+            return
+
+        self.cache.put(cache_key, appraisal)
+        if request_id == self._latest_request_id:
+            self.appraisal_finished.emit(appraisal)
+
+    def _appraise_locally(self, content):
+        if self.price_table is None:
+            try:
+                self.price_table = PriceTable(self.price_snapshot_path)
+            except (OSError, TypeError, ValueError) as e:
+                print(e)
+                print('Unable to load the price snapshot for local appraisals')
+                self.appraisal_failed.emit(str(e))
+                return
+        sell, buy, unknown = self.price_table.estimate(parse_paste(content))
+        if unknown:
+            print('No local price for: ' + ', '.join(unknown))
+        self.appraisal_finished.emit(Appraisal(sell=sell, buy=buy, volume=None))
+
+    _appraisal_queued = pyqtSignal(int, str)
+    appraisal_finished = pyqtSignal(object, name='appraisal_finished')
+    appraisal_failed = pyqtSignal(str, name='appraisal_failed')
@@ -0,0 +1,257 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Python standard library is PSF licenced
+from enum import Enum
+from time import perf_counter
+import os
+import threading
+# Other files from this project, GPL v3 licenced
+from JumpJournal import JumpJournal
+from KSpaceRoutes import StargateGraph, TRADE_HUBS
+from UniverseData import SystemTable, describe_system, looks_like_wormhole
+from WormholeChain import WormholeChain
+from WormholeLookup import WormholeCodeMatcher, load_wormhole_types
+
+# Positions the CREST handler reports that aren't systems
+NOT_A_SYSTEM = ('Offline', 'No position')
+
+
+# Checks the wormhole class of the system if we have the system table, otherwise the known naming pattern of wormhole
+# systems
+def is_wormhole(system_name, system_table=None):
+    if system_table is not None:
+        return system_table.is_wormhole(system_name)
+    return looks_like_wormhole(system_name)
+
+
+class ExploCore(object):
+    """
+    Everything the program does with character locations, wormhole codes and appraisals that doesn't need a window:
+    working out jumps into and out of wormhole space, the jump journal, the wormhole chain, routes, wormhole type
+    lookups and appraisals. The Qt window and the headless daemon are both just clients of it. They pass in what
+    happens (location changes, key presses, pastes) and hear back through callbacks registered with subscribe().
+    Callbacks are called straight away on whichever thread passed the information in, except appraisal results, which
+    are called on the appraisal handler's worker thread. A client that needs them on its own thread (anything touching
+    widgets) has to hand them over itself, for instance by emitting a signal connected to one of its own slots with
+    Qt.QueuedConnection. Only appraisals need Qt (a QCoreApplication is enough), everything else is plain Python.
+
+    settings is anything with the attributes of Settings, and data_dir is where the journal, chain and static data live.
+    Changes to the chain are saved at most every chain_save_delay seconds, on a timer thread, and when the core is
+    closed.
+    """
+
+    class Events(Enum):
+        jump = 'jump'  # Jump
+        bookmark_reminder = 'bookmark reminder'  # character, True if entering wormhole space, perf_counter() time
+        status = 'status'  # description of the primary character's system
+        wormhole_type = 'wormhole type'  # WormholeType typed
+        appraisal_finished = 'appraisal finished'  # Appraisal
+        appraisal_failed = 'appraisal failed'  # error
+
+    def __init__(self, settings, data_dir, chain_save_delay=10):
+        self.settings = settings
+        self.data_dir = data_dir
+        self._subscribers = {event: [] for event in self.Events}
+        # Last known location of each character, by name
+        self.old_locations = {}
+
+        # Class, statics and effect of every system, if the user has put a systems csv exported from the static data
+        # next to the program
+        self.system_table = SystemTable.from_csv(os.path.join(data_dir, settings.systems_path))
+        # Jumps to the trade hubs and home through k-space, which also needs the stargates from the static data
+        self.home = self.canonical_name(settings.home)
+        self.stargate_graph = None
+        stargates_path = os.path.join(data_dir, settings.stargates_path)
+        if self.system_table is not None and os.path.exists(stargates_path):
+            self.stargate_graph = StargateGraph(self.system_table, stargates_path,
+                                                hubs=TRADE_HUBS + ([self.home] if self.home else []))
+
+        # Every location change of every character is written here
+        self.jump_journal = JumpJournal(os.path.join(data_dir, 'jump_journal.sqlite'))
+        # Connections we've seen used, so we can work out the way home through the chain
+        self.chain_path = os.path.join(data_dir, 'wormhole_chain.json')
+        self.wormhole_chain = WormholeChain.load(self.chain_path, max_edge_age=settings.chain_edge_lifetime)
+        self.chain_save_delay = chain_save_delay
+        # Held while the chain is changed or saved, as saves happen on the timer's thread
+        self._chain_lock = threading.Lock()
+        self._chain_save_timer = None
+
+        self.wormhole_types = None
+        self.wormhole_matcher = None
+        self.appraisal_handler = None
+
+    def subscribe(self, event, callback):
+        self._subscribers[event].append(callback)
+
+    def unsubscribe(self, event, callback):
+        self._subscribers[event].remove(callback)
+
+    def _emit(self, event, *args):
+        for callback in list(self._subscribers[event]):
+            callback(*args)
+
+    # Called for every location change of every character. Returns the Jump recorded in the journal, or None if the
+    # character went offline or lost their position, as only arrivals in real systems are journalled. Coming back
+    # after that is journalled like the first location we saw for them, with no from_system
+    def handle_location(self, character, new_pos):
+        triggered_at = perf_counter()
+        old_location = self.old_locations.get(character)
+        old_is_wormhole = is_wormhole(old_location, self.system_table)
+        new_is_wormhole = is_wormhole(new_pos, self.system_table)
+        jump = None
+        if new_pos not in NOT_A_SYSTEM:
+            jump = self.jump_journal.record(character, old_location if old_location not in NOT_A_SYSTEM else None,
+                                            new_pos, old_is_wormhole or new_is_wormhole)
+        if old_is_wormhole or new_is_wormhole:
+            self._update_wormhole_chain(old_location, new_pos)
+        self.old_locations[character] = new_pos
+        if jump is not None:
+            self._emit(self.Events.jump, jump)
+        if ((old_is_wormhole and new_pos != "Offline") or
+                (new_is_wormhole and old_location not in NOT_A_SYSTEM)) and \
+                self.settings.reminder_bookmark_wormhole:
+            self._emit(self.Events.bookmark_reminder, character, new_is_wormhole, triggered_at)
+        return jump
+
+    # Called when the primary character moves, to describe where they are now
+    def handle_primary_location(self, new_pos):
+        status = self.describe_location(new_pos)
+        if status:
+            self._emit(self.Events.status, status)
+
+    # What we know about the system: its class and statics, and how far it is to the trade hubs and home, e.g.
+    # "J123456 C3 Pulsar, statics: D845 U210 | 4 jumps home to J654321: ..." or "Jita 14j / home 6j"
+    def describe_location(self, system):
+        status = []
+        system_info = self.system_table.get(system) if self.system_table is not None else None
+        if system_info is not None:
+            status.append(describe_system(system_info))
+        if self.stargate_graph is not None:
+            hub_jumps = self.stargate_graph.hub_jumps(system)
+            if hub_jumps:
+                status.append(' / '.join(('home' if hub.lower() == self.home.lower() else hub) + ' ' + str(jumps) +
+                                         'j' for hub, jumps in hub_jumps.items()))
+        if self.home and (self.stargate_graph is None or self.stargate_graph.jumps_to_hub(system, self.home) is None):
+            route = self.wormhole_chain.shortest_path(system, self.home)
+            if route is not None:
+                status.append(str(len(route) - 1) + ' jumps home to ' + self.home + ': ' + ' > '.join(route))
+            elif system in self.wormhole_chain:
+                status.append('No known route home to ' + self.home)
+        return ' | '.join(status)
+
+    # The name as the static data spells it, so "jita" typed into the settings matches the "Jita" the CREST handler and
+    # the stargate graph use. Names we don't have in the system table are left as they are
+    def canonical_name(self, system):
+        system = system.strip()
+        if self.system_table is not None:
+            row = self.system_table.row_for(system)
+            if row is not None:
+                return self.system_table.name(row)
+        return system
+
+    def set_home(self, home):
+        home = self.canonical_name(home)
+        if self.stargate_graph is not None:
+            if self.home and self.home not in TRADE_HUBS:
+                self.stargate_graph.remove_hub(self.home)
+            if home:
+                self.stargate_graph.add_hub(home)
+        self.home = home
+
+    # Only jumps into, out of or within wormhole space go in the chain, and only between real systems, as logging off
+    # and back on isn't a connection between systems
+    def _update_wormhole_chain(self, old_location, new_pos):
+        if new_pos in NOT_A_SYSTEM or old_location is None or old_location in NOT_A_SYSTEM:
+            return
+        with self._chain_lock:
+            self.wormhole_chain.expire()
+            self.wormhole_chain.add_jump(old_location, new_pos)
+            # Jumps made while a save is already waiting go out with it
+            if self._chain_save_timer is None:
+                self._chain_save_timer = threading.Timer(self.chain_save_delay, self.save_chain)
+                self._chain_save_timer.daemon = True
+                self._chain_save_timer.start()
+
+    def save_chain(self):
+        with self._chain_lock:
+            if self._chain_save_timer is None:
+                # Nothing has changed since the last save
+                return
+            self._chain_save_timer.cancel()
+            self._chain_save_timer = None
+            self.wormhole_chain.save(self.chain_path)
+
+    def load_wormhole_types(self, filepath):
+        if self.wormhole_matcher is None:
+            self.wormhole_types = load_wormhole_types(filepath)
+            self.wormhole_matcher = WormholeCodeMatcher(self.wormhole_types)
+
+    # Only the wormhole types that were added, removed or changed are updated in the matcher
+    def reload_wormhole_types(self, filepath):
+        if self.wormhole_matcher is None:
+            # Nothing loaded yet, it'll be read fresh when it's first needed
+            return
+        try:
+            new_types = load_wormhole_types(filepath)
+        except (OSError, ValueError, IndexError) as e:
+            print(e)
+            print('Unable to reload the wormhole types, keeping the old ones')
+            return
+        for code in set(self.wormhole_types) - set(new_types):
+            self.wormhole_matcher.remove(code)
+        for code, wh_type in new_types.items():
+            if self.wormhole_types.get(code) != wh_type:
+                self.wormhole_matcher.add(code, wh_type)
+        self.wormhole_types = new_types
+
+    # Feeds one typed character into the wormhole code matcher. Anything that isn't a single character (space, enter,
+    # backspace etc.) breaks up a wormhole code, and should be passed as None
+    def handle_key(self, char, timestamp=None):
+        if char is None:
+            self.wormhole_matcher.reset()
+            return None
+        wh_type = self.wormhole_matcher.feed(char, timestamp)
+        if wh_type is not None:
+            self._emit(self.Events.wormhole_type, wh_type)
+        return wh_type
+
+    # Appraisals run on the appraisal handler's own thread, which is only started (and requests only imported) the
+    # first time something is appraised
+    def appraise(self, content):
+        if self.appraisal_handler is None:
+            from PyQt5.QtCore import Qt
+            from EvePraisalHandler import EvePraisalHandler
+            self.appraisal_handler = EvePraisalHandler(
+                cache_path=os.path.join(self.data_dir, 'appraisal_cache.json'),
+                cache_ttl=self.settings.appraisal_cache_ttl, cache_size=self.settings.appraisal_cache_size,
+                backend=self.settings.appraisal_backend,
+                price_snapshot_path=os.path.join(self.data_dir, self.settings.price_snapshot))
+            # Called on the worker thread, as the core has no thread of its own to pass them back to
+            self.appraisal_handler.appraisal_finished.connect(
+                lambda appraisal: self._emit(self.Events.appraisal_finished, appraisal), Qt.DirectConnection)
+            self.appraisal_handler.appraisal_failed.connect(
+                lambda error: self._emit(self.Events.appraisal_failed, error), Qt.DirectConnection)
+        self.appraisal_handler.request_appraisal(content)
+
+    def close(self):
+        self.save_chain()
+        self.jump_journal.close()
+        if self.system_table is not None:
+            self.system_table.close()
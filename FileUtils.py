@@ -0,0 +1,38 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Python standard library is PSF licenced
+import os
+
+
+# Writes data (str for mode 'w', bytes for mode 'wb') to a temporary file next to path and then moves it over path, so a
+# crash part way through never leaves a half written file behind. Raises OSError if it can't be written, in which case
+# whatever was at path before is left as it was
+def atomic_write(path, data, mode='w'):
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, mode) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,57 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Requests is apache 2.0 licenced
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledSession(requests.Session):
+    """
+    A requests Session that keeps connections to each host alive between requests, so polling the same server every
+    few seconds doesn't pay for a new TCP and TLS handshake every time. Up to max_per_host connections to each host are
+    kept open. A request made while they're all busy opens one of its own rather than waiting, which is closed once it's
+    done, so a stalled request never holds up the others. Every request gets the same timeout unless it asks for its
+    own.
+    """
+
+    def __init__(self, user_agent='eveExploHelper', timeout=10, max_hosts=8, max_per_host=2):
+        super(PooledSession, self).__init__()
+        self.timeout = timeout  # seconds before assuming http connection has timed out
+        adapter = HTTPAdapter(pool_connections=max_hosts, pool_maxsize=max_per_host)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.headers['User-Agent'] = user_agent
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super(PooledSession, self).request(method, url, **kwargs)
+
+    # Counts of requests sent and connections opened to the hosts currently in the pool. Every request beyond the
+    # number of connections went out over a connection that was already open
+    def get_connection_stats(self):
+        stats = {'requests': 0, 'connections': 0}
+        for adapter in set(self.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools[pool_key]
+                stats['requests'] += pool.num_requests
+                stats['connections'] += pool.num_connections
+        stats['reused'] = stats['requests'] - stats['connections']
+        return stats
@@ -0,0 +1,112 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Python standard library is PSF licenced
+from collections import deque, namedtuple
+from time import time
+import sqlite3
+
+# A single location change. time is in seconds since the epoch, from_system is None for the first location we saw
+# for a character (or the first after they were offline), and wormhole is True if either end of the jump was in a
+# wormhole system. Both systems are always real systems, never a state like 'Offline'
+Jump = namedtuple('Jump', ['time', 'character', 'from_system', 'to_system', 'wormhole'])
+
+
+class JumpJournal(object):
+    """
+    Append only log of every location change, kept in an SQLite database so it survives crashes (every jump is
+    committed as soon as it is recorded) and can be queried by system, time or character through indexes, even with
+    months of history. The most recent jumps are also kept in memory in tail for the UI.
+    """
+
+    def __init__(self, path, tail_size=100):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # Write ahead logging means a crash part way through a write can never corrupt the jumps already recorded
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS jumps (
+                id INTEGER PRIMARY KEY,
+                time REAL NOT NULL,
+                character TEXT NOT NULL,
+                from_system TEXT,
+                to_system TEXT NOT NULL,
+                wormhole INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jumps_by_system ON jumps (to_system, time);
+            CREATE INDEX IF NOT EXISTS jumps_by_time ON jumps (time);
+            CREATE INDEX IF NOT EXISTS jumps_by_character ON jumps (character, time);
+        ''')
+        self._upgrade()
+        self.tail = deque(reversed(self._query('ORDER BY time DESC LIMIT ?', (tail_size,))), maxlen=tail_size)
+
+    def record(self, character, from_system, to_system, wormhole, timestamp=None):
+        jump = Jump(timestamp if timestamp is not None else time(), character, from_system, to_system, bool(wormhole))
+        with self.connection:
+            self.connection.execute('INSERT INTO jumps (time, character, from_system, to_system, wormhole) '
+                                    'VALUES (?, ?, ?, ?, ?)', jump)
+        self.tail.append(jump)
+        return jump
+
+    # When we last arrived in the system, or None if we never have
+    def last_visit(self, system, character=None):
+        query = 'SELECT MAX(time) FROM jumps WHERE to_system = ?'
+        parameters = [system]
+        if character is not None:
+            query += ' AND character = ?'
+            parameters.append(character)
+        return self.connection.execute(query, parameters).fetchone()[0]
+
+    # All jumps since the given time, oldest first
+    def jumps_since(self, since, character=None, wormhole_only=False):
+        conditions = 'WHERE time >= ?'
+        parameters = [since]
+        if character is not None:
+            conditions += ' AND character = ?'
+            parameters.append(character)
+        if wormhole_only:
+            conditions += ' AND wormhole = 1'
+        return self._query(conditions + ' ORDER BY time', parameters)
+
+    def visits(self, system, character=None):
+        conditions = 'WHERE to_system = ?'
+        parameters = [system]
+        if character is not None:
+            conditions += ' AND character = ?'
+            parameters.append(character)
+        return self._query(conditions + ' ORDER BY time', parameters)
+
+    def close(self):
+        self.connection.close()
+
+    # Journals from before user_version 1 also recorded going offline or losing the position as jumps to 'Offline' or
+    # 'No position'. Those rows are dropped, and jumps from them become a character's first location like they are now
+    def _upgrade(self):
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] >= 1:
+            return
+        not_a_system = ('Offline', 'No position')
+        with self.connection:
+            self.connection.execute('DELETE FROM jumps WHERE to_system IN (?, ?)', not_a_system)
+            self.connection.execute('UPDATE jumps SET from_system = NULL WHERE from_system IN (?, ?)', not_a_system)
+            self.connection.execute('PRAGMA user_version = 1')
+
+    def _query(self, conditions, parameters):
+        rows = self.connection.execute('SELECT time, character, from_system, to_system, wormhole FROM jumps ' +
+                                       conditions, parameters)
+        return [Jump(row[0], row[1], row[2], row[3], bool(row[4])) for row in rows]
@@ -0,0 +1,194 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Python standard library is PSF licenced
+from array import array
+from collections import OrderedDict, deque
+import heapq
+
+TRADE_HUBS = ['Jita', 'Amarr', 'Dodixie', 'Rens', 'Hek']
+
+# Anything under this rounds down to lowsec in game
+HIGHSEC = 0.45
+# How many jumps through highsec the safest route will take to avoid one jump into low or nullsec
+UNSAFE_JUMP_COST = 50
+
+# Distance to systems a hub can't be reached from
+_UNREACHABLE = -1
+
+
+class StargateGraph(object):
+    """
+    The stargate connections between k-space systems, with systems numbered by their row in the SystemTable. Routes are
+    found with a breadth first search from both ends at once, which only has to visit a small part of the map, and the
+    last few routes asked for are cached. Jump counts from every system to a handful of hubs are worked out once up
+    front, so the counts shown on every jump are just a lookup in an array.
+    """
+
+    def __init__(self, system_table, jumps_path, hubs=None, cache_size=64):
+        self.system_table = system_table
+        rows_by_id = {system_table.system_id(row): row for row in range(len(system_table))}
+        self.neighbours = [[] for _ in range(len(system_table))]
+        # A csv of the stargate jumps from the static data, FromSystemID,ToSystemID, with each gate listed from both
+        # ends
+        with open(jumps_path) as f:
+            next(f, None)  # Skip the header row
+            for line in f:
+                line = line.strip()
+                if line == '':
+                    continue
+                from_id, to_id = line.split(',', 1)
+                from_row = rows_by_id.get(int(from_id))
+                to_row = rows_by_id.get(int(to_id))
+                if from_row is not None and to_row is not None and to_row not in self.neighbours[from_row]:
+                    self.neighbours[from_row].append(to_row)
+        self.route_cache = OrderedDict()
+        self.cache_size = cache_size
+        # hub name -> array of jumps from each system to the hub
+        self.hub_distances = OrderedDict()
+        for hub in (hubs if hubs is not None else TRADE_HUBS):
+            self.add_hub(hub)
+
+    # Works out the jumps from every system to the hub, so jumps_to_hub can answer without searching
+    def add_hub(self, hub):
+        hub_row = self.system_table.row_for(hub)
+        if hub_row is None:
+            return
+        distances = array('i', [_UNREACHABLE]) * len(self.neighbours)
+        distances[hub_row] = 0
+        queue = deque([hub_row])
+        while queue:
+            row = queue.popleft()
+            for neighbour in self.neighbours[row]:
+                if distances[neighbour] == _UNREACHABLE:
+                    distances[neighbour] = distances[row] + 1
+                    queue.append(neighbour)
+        self.hub_distances[self.system_table.name(hub_row)] = distances
+
+    def remove_hub(self, hub):
+        self.hub_distances.pop(hub, None)
+
+    def jumps_to_hub(self, system, hub):
+        row = self.system_table.row_for(system)
+        distances = self.hub_distances.get(hub)
+        if row is None or distances is None or distances[row] == _UNREACHABLE:
+            return None
+        return distances[row]
+
+    # Jumps from the system to every hub we know the way to, in the order the hubs were added
+    def hub_jumps(self, system):
+        row = self.system_table.row_for(system)
+        if row is None:
+            return OrderedDict()
+        return OrderedDict((hub, distances[row]) for hub, distances in self.hub_distances.items()
+                           if distances[row] != _UNREACHABLE)
+
+    # The systems from start to end (both included), or None if they aren't connected by gates. The shortest route
+    # ignores security, the safest one avoids low and nullsec where it can
+    def route(self, start, end, safest=False):
+        key = (start, end, safest)
+        if key in self.route_cache:
+            self.route_cache.move_to_end(key)
+            return self.route_cache[key]
+        start_row = self.system_table.row_for(start)
+        end_row = self.system_table.row_for(end)
+        if start_row is None or end_row is None:
+            return None
+        if safest:
+            rows = self._safest_route(start_row, end_row)
+        else:
+            rows = self._shortest_route(start_row, end_row)
+        route = None if rows is None else [self.system_table.name(row) for row in rows]
+        self.route_cache[key] = route
+        if len(self.route_cache) > self.cache_size:
+            self.route_cache.popitem(last=False)
+        return route
+
+    def jumps(self, start, end, safest=False):
+        route = self.route(start, end, safest)
+        return None if route is None else len(route) - 1
+
+    # Breadth first search from both ends, always growing whichever side has the smaller frontier, until they meet
+    def _shortest_route(self, start_row, end_row):
+        if start_row == end_row:
+            return [start_row]
+        forward = {start_row: None}
+        backward = {end_row: None}
+        forward_frontier = [start_row]
+        backward_frontier = [end_row]
+        while forward_frontier and backward_frontier:
+            if len(forward_frontier) <= len(backward_frontier):
+                frontier, seen, other_side = forward_frontier, forward, backward
+            else:
+                frontier, seen, other_side = backward_frontier, backward, forward
+            next_frontier = []
+            meetings = []
+            for row in frontier:
+                for neighbour in self.neighbours[row]:
+                    if neighbour not in seen:
+                        seen[neighbour] = row
+                        next_frontier.append(neighbour)
+                        if neighbour in other_side:
+                            meetings.append(neighbour)
+            # Finish the whole level before stopping, as the first place the searches meet isn't always on the
+            # shortest route
+            if meetings:
+                return min((self._join(forward, backward, meeting) for meeting in meetings), key=len)
+            if frontier is forward_frontier:
+                forward_frontier = next_frontier
+            else:
+                backward_frontier = next_frontier
+        return None
+
+    @staticmethod
+    def _join(forward, backward, meeting):
+        path = []
+        row = meeting
+        while row is not None:
+            path.append(row)
+            row = forward[row]
+        path.reverse()
+        row = backward[meeting]
+        while row is not None:
+            path.append(row)
+            row = backward[row]
+        return path
+
+    # Dijkstra, where a jump into low or nullsec costs as much as UNSAFE_JUMP_COST jumps through highsec
+    def _safest_route(self, start_row, end_row):
+        previous = {start_row: None}
+        costs = {start_row: 0}
+        queue = [(0, start_row)]
+        while queue:
+            cost, row = heapq.heappop(queue)
+            if row == end_row:
+                path = []
+                while row is not None:
+                    path.append(row)
+                    row = previous[row]
+                return path[::-1]
+            if cost > costs[row]:
+                continue
+            for neighbour in self.neighbours[row]:
+                new_cost = cost + (1 if self.system_table.security(neighbour) >= HIGHSEC else UNSAFE_JUMP_COST)
+                if new_cost < costs.get(neighbour, new_cost + 1):
+                    costs[neighbour] = new_cost
+                    previous[neighbour] = row
+                    heapq.heappush(queue, (new_cost, neighbour))
+        return None
@@ -0,0 +1,207 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# PyQt is GPL v3
+from PyQt5.QtCore import QCoreApplication, QFileSystemWatcher, QObject, QSettings, QTimer, pyqtSignal
+# Python standard library is PSF licenced
+from collections import namedtuple
+import os
+
+# attribute is the name the value is read through on Settings, key is where it lives in settings.ini. validate is None
+# or a function returning whether a value (already converted to type) is allowed
+Setting = namedtuple('Setting', ['attribute', 'key', 'type', 'default', 'validate'])
+
+SCHEMA = [
+    Setting('shortcut', 'main/shortcut', str, 'shift+0+9', None),
+
+    Setting('crest_client_id', 'CREST/client_id', str, '', None),
+    Setting('crest_secret', 'CREST/secret', str, '', None),
+    Setting('save_refresh_token', 'CREST/saveRefreshToken', bool, False, None),
+    Setting('refresh_token', 'CREST/refreshToken', str, '', None),
+
+    Setting('reminder_bookmark_wormhole', 'features/reminderBookmarkWormhole', bool, True, None),
+    Setting('eve_praisal_clipboard', 'features/evePraisalClipboard', bool, True, None),
+    Setting('wormhole_type_keycombo', 'features/wormholeTypeKeycombo', bool, True, None),
+    Setting('reminder_bookmark_wormhole_sound', 'features/reminderBookmarkWormholeSound', bool, True, None),
+    Setting('reminder_bookmark_wormhole_flash_text', 'features/reminderBookmarkWormholeFlashText', bool, True, None),
+
+    Setting('sound_path', 'sound/path', str, 'bookmarkTheHole.wav', None),
+    # Empty means use sound/path for entering and leaving wormhole space, and no sound when an appraisal is done
+    Setting('sound_enter_wormhole', 'sound/enterWormhole', str, '', None),
+    Setting('sound_leave_wormhole', 'sound/leaveWormhole', str, '', None),
+    Setting('sound_appraisal_done', 'sound/appraisalDone', str, '', None),
+
+    Setting('appraisal_backend', 'appraisal/backend', str, 'evepraisal',
+            lambda value: value in ('evepraisal', 'local')),
+    Setting('price_snapshot', 'appraisal/priceSnapshot', str, 'prices.csv', None),
+    Setting('appraisal_cache_ttl', 'appraisal/cacheTTL', int, 3600, lambda value: value >= 0),
+    Setting('appraisal_cache_size', 'appraisal/cacheSize', int, 200, lambda value: value > 0),
+
+    Setting('systems_path', 'universe/systems', str, 'systems.csv', None),
+    Setting('stargates_path', 'universe/stargates', str, 'stargates.csv', None),
+
+    Setting('home', 'chain/home', str, '', None),
+    Setting('chain_edge_lifetime', 'chain/edgeLifetime', int, 24 * 60 * 60, lambda value: value > 0),
+
+    Setting('port', 'network/port', int, 4173, lambda value: 0 < value < 65536),
+]
+
+SCHEMA_BY_ATTRIBUTE = {setting.attribute: setting for setting in SCHEMA}
+
+
+# Called if the settings ini is not found, we write a new one with the default settings
+def write_default_settings(settings):
+    for setting in SCHEMA:
+        settings.setValue(setting.key, _to_ini(setting.default))
+
+
+# Booleans are kept as 0 / 1 in the ini, as they always have been
+def _to_ini(value):
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _convert(setting, value):
+    if setting.type is bool:
+        if isinstance(value, str):
+            if value.strip().lower() in ('true', 'false'):
+                return value.strip().lower() == 'true'
+            value = int(value)
+        return bool(value)
+    if setting.type is str and isinstance(value, list):
+        # QSettings reads an unquoted value with commas in it as a list
+        return ', '.join(value)
+    return setting.type(value)
+
+
+class WatchedFile(QObject):
+    """
+    Emits changed whenever the file at path is edited. Many editors save by replacing the file rather than writing to
+    it, which stops QFileSystemWatcher watching it, so the new file is watched again each time. A file that doesn't
+    exist yet isn't watched until watch() is called once it does.
+    """
+
+    def __init__(self, path, parent=None):
+        super(WatchedFile, self).__init__(parent)
+        self.path = path
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._handle_file_changed)
+        self.watch()
+
+    def watch(self):
+        if os.path.exists(self.path) and self.path not in self._watcher.files():
+            self._watcher.addPath(self.path)
+
+    def _handle_file_changed(self, path):
+        self.watch()
+        self.changed.emit(self.path)
+
+    changed = pyqtSignal(str)
+
+
+class Settings(QObject):
+    """
+    Every setting in settings.ini, read and checked against SCHEMA once when the program starts, then kept as plain
+    attributes (settings.reminder_bookmark_wormhole, settings.port, ...) so reading one is just an attribute lookup.
+    Anything missing or invalid in the ini gets its default. Changes go through set(), which updates the attribute
+    straight away and emits changed, while the write back to the ini is batched up and done flush_delay ms later.
+    The ini is also watched, and when it is edited by hand only the settings that actually changed are updated, each
+    emitting changed as if set() had been called.
+    """
+
+    def __init__(self, filename, flush_delay=500, parent=None):
+        super(Settings, self).__init__(parent)
+        self._settings = QSettings(filename, QSettings.IniFormat)
+        self._dirty = set()
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(flush_delay)
+        self._flush_timer.timeout.connect(self.flush)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.flush)
+        self.reload()
+        self._watched_file = WatchedFile(self.file_name(), self)
+        self._watched_file.changed.connect(self._handle_file_changed)
+
+    # Path to the ini the settings are read from and written to
+    def file_name(self):
+        return self._settings.fileName()
+
+    # Writes every setting's default to the ini, for when there isn't one yet
+    def write_defaults(self):
+        write_default_settings(self._settings)
+        self._settings.sync()
+        self.reload()
+        self._watched_file.watch()
+
+    def reload(self):
+        self._settings.sync()
+        for setting in SCHEMA:
+            setattr(self, setting.attribute, self._read(setting))
+
+    # Checks and stores a new value, and writes it to the ini soon after. Raises ValueError if the value isn't allowed
+    def set(self, attribute, value):
+        setting = SCHEMA_BY_ATTRIBUTE[attribute]
+        value = _convert(setting, value)
+        if setting.validate is not None and not setting.validate(value):
+            raise ValueError(repr(value) + ' is not a valid value for ' + setting.key)
+        if getattr(self, attribute) == value:
+            return
+        setattr(self, attribute, value)
+        self._dirty.add(attribute)
+        self._flush_timer.start()
+        self.changed.emit(attribute, value)
+
+    def flush(self):
+        self._flush_timer.stop()
+        for attribute in self._dirty:
+            self._settings.setValue(SCHEMA_BY_ATTRIBUTE[attribute].key, _to_ini(getattr(self, attribute)))
+        self._dirty.clear()
+        self._settings.sync()
+
+    # Our own flushes land here too, but then nothing has changed so nothing is emitted. Settings set() but not yet
+    # flushed keep the value they were set to
+    def _handle_file_changed(self, path):
+        self._settings.sync()
+        for setting in SCHEMA:
+            if setting.attribute in self._dirty:
+                continue
+            value = self._read(setting)
+            if value != getattr(self, setting.attribute):
+                setattr(self, setting.attribute, value)
+                self.changed.emit(setting.attribute, value)
+
+    def _read(self, setting):
+        value = self._settings.value(setting.key)
+        if value is None:
+            return setting.default
+        try:
+            value = _convert(setting, value)
+        except (TypeError, ValueError):
+            print('Unable to read ' + setting.key + ' from the settings, using ' + repr(setting.default))
+            return setting.default
+        if setting.validate is not None and not setting.validate(value):
+            print(repr(value) + ' is not a valid value for ' + setting.key + ', using ' + repr(setting.default))
+            return setting.default
+        return value
+
+    # attribute name, new value
+    changed = pyqtSignal(str, object)
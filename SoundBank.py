@@ -0,0 +1,105 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Python standard library is PSF licenced
+from collections import deque
+from enum import Enum
+from time import perf_counter
+import wave
+
+
+# Simple audio is only imported when the first sound is loaded, so it doesn't slow down starting the program
+def _load_wave(path):
+    # Simple audio is MIT licenced
+    import simpleaudio as sa
+    return sa.WaveObject.from_wave_file(path)
+
+
+class SoundBank(object):
+    """
+    The sounds played for each event, read and decoded the first time they're played rather than every time, so starting
+    the program doesn't wait on decoding wavs that might never be needed. A WaveObject holds the whole decoded wav in
+    memory, so playing one again only hands the buffer to the sound card, which matters when we've just jumped through a
+    wormhole and want the reminder straight away. Events sharing a file share the buffer too. How long it took from the
+    event to the sound starting is kept in latencies, in seconds.
+    """
+
+    class Events(Enum):
+        enter_wormhole = 'enter wormhole'
+        leave_wormhole = 'leave wormhole'
+        appraisal_done = 'appraisal done'
+
+    def __init__(self, latency_history=50):
+        self._waves = {}  # path -> WaveObject
+        self._paths = {}  # event -> path
+        self.latencies = deque(maxlen=latency_history)
+
+    # Sets the file played for the event, or removes its sound if path is empty. The file isn't read until it's played
+    def set_sound(self, event, path):
+        if not path:
+            self._paths.pop(event, None)
+        else:
+            self._paths[event] = path
+        # Forget any files no event uses any more
+        for old_path in set(self._waves) - set(self._paths.values()):
+            del self._waves[old_path]
+
+    def has_sound(self, event):
+        return event in self._paths
+
+    # Plays the event's sound, if it has one. triggered_at is the perf_counter() time the event happened, used to work
+    # out how long it took before the sound started. A file that can't be read is reported and the event left without a
+    # sound until it's set again, rather than trying the file on every event
+    def play(self, event, triggered_at=None):
+        path = self._paths.get(event)
+        if path is None:
+            return None
+        try:
+            wave_obj = self._load(path)
+        except (wave.Error, OSError) as e:
+            print(e)
+            print('Unable to load the ' + event.value + ' sound')
+            del self._paths[event]
+            return None
+        play_object = wave_obj.play()
+        if triggered_at is not None:
+            latency = perf_counter() - triggered_at
+            self.latencies.append(latency)
+        return play_object
+
+    # Plays any file, keeping it loaded if an event uses it. Used to test a sound before choosing it. Raises wave.Error
+    # or FileNotFoundError if the file can't be read
+    def play_file(self, path):
+        if path in self._paths.values():
+            return self._load(path).play()
+        return _load_wave(path).play()
+
+    # How many of the recent sounds had their latency recorded, and the last, mean and worst latency of them in seconds
+    # (None if there aren't any yet)
+    def get_latency_stats(self):
+        latencies = list(self.latencies)
+        if not latencies:
+            return {'played': 0, 'last': None, 'mean': None, 'max': None}
+        return {'played': len(latencies), 'last': latencies[-1], 'mean': sum(latencies) / len(latencies),
+                'max': max(latencies)}
+
+    def _load(self, path):
+        if path not in self._waves:
+            self._waves[path] = _load_wave(path)
+        return self._waves[path]
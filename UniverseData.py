@@ -0,0 +1,217 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Python standard library is PSF licenced
+from array import array
+from collections import namedtuple
+import mmap
+import os
+import re
+import struct
+import zlib
+# Other files from this project, GPL v3 licenced
+from FileUtils import atomic_write
+
+# Wormhole class IDs from the static data export. 1 - 6 are the normal wormhole classes, 12 is Thera, 13 the shattered
+# frigate holes and 14 - 18 the drifter systems. 7, 8 and 9 are high, low and nullsec, and 0 means we don't know
+WORMHOLE_CLASSES = frozenset([1, 2, 3, 4, 5, 6, 12, 13, 14, 15, 16, 17, 18])
+
+# Start of string followed by J followed by any number of integers followed by end of string
+_WORMHOLE_NAME = re.compile('^J[0-9]+$')
+
+SystemInfo = namedtuple('SystemInfo', ['id', 'name', 'security', 'wormhole_class', 'statics', 'effect'])
+
+# magic, version, number of systems, number of hash slots, then the byte offset of each section
+_HEADER = struct.Struct('<4sIIIIIIIIII')
+_MAGIC = b'EEHS'
+_VERSION = 1
+
+
+# Used when we don't have the system table (or the system isn't in it), from the naming pattern of wormhole systems
+def looks_like_wormhole(system_name):
+    if system_name is None:
+        return False
+    return system_name == 'Thera' or bool(_WORMHOLE_NAME.match(system_name))
+
+
+def _slot_for(name, slots):
+    return zlib.crc32(name.lower().encode('utf-8')) & (slots - 1)
+
+
+# Converts a csv exported from the static data (SystemID,Name,Security,WormholeClass,Statics,Effect, with the statics
+# separated by spaces) into the binary table SystemTable reads. Done once, and again whenever the csv changes
+def compile_system_table(csv_path, table_path):
+    ids = array('i')
+    security = array('f')
+    wormhole_classes = array('i')
+    strings = bytearray()
+    string_offsets = array('I', [0])  # name, statics and effect of each system, one after the other
+    with open(csv_path, encoding='utf-8') as f:
+        next(f, None)  # Skip the header row
+        for line in f:
+            line = line.strip()
+            if line == '':
+                continue
+            system_id, name, sec, wh_class, statics, effect = line.split(',', 5)
+            ids.append(int(system_id))
+            security.append(float(sec))
+            wormhole_classes.append(int(wh_class or 0))
+            for text in (name, statics, effect):
+                strings += text.strip().encode('utf-8')
+                string_offsets.append(len(strings))
+
+    # Open addressing hash table of system name -> row, at most half full so a lookup almost always finds the name in
+    # its first or second slot
+    count = len(ids)
+    slots = 1
+    while slots < count * 2:
+        slots *= 2
+    name_index = array('i', [-1]) * slots
+    for row in range(count):
+        name = strings[string_offsets[row * 3]:string_offsets[row * 3 + 1]].decode('utf-8')
+        slot = _slot_for(name, slots)
+        while name_index[slot] != -1:
+            slot = (slot + 1) & (slots - 1)
+        name_index[slot] = row
+
+    sections = [ids.tobytes(), security.tobytes(), wormhole_classes.tobytes(), string_offsets.tobytes(),
+                name_index.tobytes(), bytes(strings)]
+    offsets = []
+    position = _HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+    atomic_write(table_path, _HEADER.pack(_MAGIC, _VERSION, count, slots, *offsets, position) + b''.join(sections),
+                 'wb')
+
+
+class SystemTable(object):
+    """
+    Static information about every solar system, memory mapped from the binary table compile_system_table writes.
+    Nothing is parsed or copied when the table is opened, the arrays are read straight out of the mapped file, so
+    opening it costs next to nothing and the OS only pages in the parts we look at. Lookups by name go through a hash
+    table stored in the same file.
+    """
+
+    def __init__(self, table_path):
+        with open(table_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.count, self._slots, ids_at, security_at, classes_at, string_offsets_at, name_index_at,
+         strings_at, end) = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC or version != _VERSION or end != len(self._map):
+            self._map.close()
+            raise ValueError(table_path + ' is not a system table')
+        view = memoryview(self._map)
+        self._ids = view[ids_at:security_at].cast('i')
+        self._security = view[security_at:classes_at].cast('f')
+        self._classes = view[classes_at:string_offsets_at].cast('i')
+        self._string_offsets = view[string_offsets_at:name_index_at].cast('I')
+        self._name_index = view[name_index_at:strings_at].cast('i')
+        self._strings = view[strings_at:end]
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, name):
+        return self.row_for(name) is not None
+
+    # Opens the binary table next to csv_path, rebuilding it first if it is missing or older than the csv. Returns None
+    # if there is no system data at all
+    @classmethod
+    def from_csv(cls, csv_path, table_path=None):
+        if table_path is None:
+            table_path = os.path.splitext(csv_path)[0] + '.bin'
+        if not os.path.exists(csv_path) and not os.path.exists(table_path):
+            return None
+        try:
+            if os.path.exists(csv_path) and (not os.path.exists(table_path) or
+                                             os.path.getmtime(table_path) < os.path.getmtime(csv_path)):
+                compile_system_table(csv_path, table_path)
+            return cls(table_path)
+        except (OSError, ValueError) as e:
+            print(e)
+            print('Unable to load the system table, falling back on system names')
+            return None
+
+    def row_for(self, name):
+        if name is None or self.count == 0:
+            return None
+        encoded = name.lower().encode('utf-8')
+        slot = zlib.crc32(encoded) & (self._slots - 1)
+        while True:
+            row = self._name_index[slot]
+            if row == -1:
+                return None
+            if self._string(row * 3).lower() == encoded:
+                return row
+            slot = (slot + 1) & (self._slots - 1)
+
+    def get(self, name):
+        row = self.row_for(name)
+        if row is None:
+            return None
+        statics = self._string(row * 3 + 1).decode('utf-8').split()
+        return SystemInfo(self._ids[row], self._string(row * 3).decode('utf-8'), self._security[row],
+                          self._classes[row], statics, self._string(row * 3 + 2).decode('utf-8'))
+
+    # Per row accessors, for code that works with row numbers rather than names (e.g. the stargate graph)
+    def name(self, row):
+        return self._string(row * 3).decode('utf-8')
+
+    def system_id(self, row):
+        return self._ids[row]
+
+    def security(self, row):
+        return self._security[row]
+
+    def wormhole_class(self, name):
+        row = self.row_for(name)
+        return None if row is None else self._classes[row]
+
+    def is_wormhole(self, name):
+        row = self.row_for(name)
+        if row is None:
+            return looks_like_wormhole(name)
+        return self._classes[row] in WORMHOLE_CLASSES
+
+    def close(self):
+        for view in (self._ids, self._security, self._classes, self._string_offsets, self._name_index, self._strings):
+            view.release()
+        self._map.close()
+
+    def _string(self, index):
+        return bytes(self._strings[self._string_offsets[index]:self._string_offsets[index + 1]])
+
+
+# A short description of a system for the status bar, e.g. "J123456 C3 Pulsar, statics: D845 U210"
+def describe_system(info):
+    if info.wormhole_class in WORMHOLE_CLASSES:
+        if info.wormhole_class == 12:
+            description = info.name
+        elif info.wormhole_class <= 6:
+            description = info.name + ' C' + str(info.wormhole_class)
+        else:
+            description = info.name + ' C' + str(info.wormhole_class) + ' (shattered / drifter)'
+    else:
+        description = info.name + ' ' + format(info.security, '.1f')
+    if info.effect:
+        description += ' ' + info.effect
+    if info.statics:
+        description += ', statics: ' + ' '.join(info.statics)
+    return description
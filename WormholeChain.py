@@ -0,0 +1,116 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Python standard library is PSF licenced
+from collections import deque
+from time import time
+import json
+# Other files from this project, GPL v3 licenced
+from FileUtils import atomic_write
+
+
+class WormholeChain(object):
+    """
+    Map of the systems we've been through and the connections we've seen used between them, built up one jump at a
+    time from the location updates. Each connection remembers when it was last used, and expire() drops the ones
+    older than max_edge_age seconds, as the wormhole has most likely collapsed by then. Connections are stored as an
+    adjacency dictionary, so looking up neighbours is a single dictionary lookup and finding a route is a plain
+    breadth first search, which stays quick even on chains of hundreds of systems.
+    """
+
+    def __init__(self, max_edge_age=24 * 60 * 60):
+        self.max_edge_age = max_edge_age
+        # system -> {neighbouring system: time the connection was last used}
+        self.edges = {}
+
+    def add_jump(self, from_system, to_system, timestamp=None):
+        if from_system is None or to_system is None or from_system == to_system:
+            return
+        if timestamp is None:
+            timestamp = time()
+        self.edges.setdefault(from_system, {})[to_system] = timestamp
+        self.edges.setdefault(to_system, {})[from_system] = timestamp
+
+    def neighbours(self, system):
+        return list(self.edges.get(system, {}))
+
+    def __contains__(self, system):
+        return system in self.edges
+
+    # The list of systems from start to end (both included) with the fewest jumps, or None if we don't know a route
+    def shortest_path(self, start, end):
+        if start not in self.edges or end not in self.edges:
+            return None
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            system = queue.popleft()
+            if system == end:
+                path = []
+                while system is not None:
+                    path.append(system)
+                    system = previous[system]
+                return path[::-1]
+            for neighbour in self.edges[system]:
+                if neighbour not in previous:
+                    previous[neighbour] = system
+                    queue.append(neighbour)
+        return None
+
+    # Drops connections that haven't been used for max_edge_age seconds, along with any systems left unconnected
+    def expire(self, now=None):
+        if now is None:
+            now = time()
+        oldest = now - self.max_edge_age
+        for system in list(self.edges):
+            neighbours = self.edges[system]
+            for neighbour in [neighbour for neighbour, last_used in neighbours.items() if last_used < oldest]:
+                del neighbours[neighbour]
+            if not neighbours:
+                del self.edges[system]
+
+    # Saved as a list of system names and a list of [system index, system index, last used] connections, so each
+    # connection is only written once and names aren't repeated
+    def save(self, path):
+        systems = sorted(self.edges)
+        index = {system: i for i, system in enumerate(systems)}
+        connections = [[index[system], index[neighbour], last_used]
+                       for system in systems
+                       for neighbour, last_used in self.edges[system].items()
+                       if index[system] < index[neighbour]]
+        try:
+            atomic_write(path, json.dumps({'systems': systems, 'connections': connections}, separators=(',', ':')))
+        except OSError as e:
+            print(e)
+            print('Unable to save the wormhole chain')
+
+    @classmethod
+    def load(cls, path, max_edge_age=24 * 60 * 60):
+        chain = cls(max_edge_age=max_edge_age)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            systems = data['systems']
+            for from_index, to_index, last_used in data['connections']:
+                chain.add_jump(systems[from_index], systems[to_index], last_used)
+        except (OSError, ValueError, KeyError, IndexError, TypeError):
+            # No saved chain (or it's unreadable), so start from scratch
+            pass
+        chain.expire()
+        return chain
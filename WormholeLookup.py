@@ -0,0 +1,227 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Python standard library is PSF licenced
+from time import time
+import os
+import pickle
+import re
+# Other files from this project, GPL v3 licenced
+from FileUtils import atomic_write
+
+# Key used inside a trie node to hold the value of a code ending at that node. Every other key is a single character,
+# so None can never clash with a real child
+_VALUE = None
+
+# Bumped whenever the layout of the cached wormhole types changes, so old caches are rebuilt rather than misread
+_CACHE_VERSION = 1
+
+# Wormhole class IDs from the static data export, matching UniverseData. Used to work out the destination class from the
+# LeadsTo text when the csv doesn't have a DestinationClass column
+_CLASS_NUMBER = re.compile(r'^Class (\d+)')
+_DESTINATION_CLASSES = {'highsec': 7, 'lowsec': 8, 'nullsec': 9, 'thera': 12}
+
+
+class WormholeType(object):
+    """
+    Everything we know about one wormhole type. Only code and leads_to are always known, the rest are None unless the
+    csv has a column for them. Masses are in kg and lifetime is in hours.
+    """
+    __slots__ = ['code', 'leads_to', 'destination_class', 'max_jump_mass', 'total_mass', 'lifetime',
+                 'mass_regeneration']
+
+    def __init__(self, code, leads_to, destination_class=None, max_jump_mass=None, total_mass=None, lifetime=None,
+                 mass_regeneration=None):
+        self.code = code
+        self.leads_to = leads_to
+        self.destination_class = destination_class
+        self.max_jump_mass = max_jump_mass
+        self.total_mass = total_mass
+        self.lifetime = lifetime
+        self.mass_regeneration = mass_regeneration
+
+    def __eq__(self, other):
+        return isinstance(other, WormholeType) and self.__getstate__() == other.__getstate__()
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    # What we show when the code is typed. Just where it leads when that's all we know, as it always used to be,
+    # otherwise something like "C248 -> Nullsec (0.0), 3000kt/jump, 16h"
+    def describe(self):
+        details = []
+        if self.max_jump_mass is not None:
+            details.append(_format_mass(self.max_jump_mass) + '/jump')
+        if self.total_mass is not None:
+            details.append(_format_mass(self.total_mass) + ' total')
+        if self.lifetime is not None:
+            details.append(format(self.lifetime, 'g') + 'h')
+        if self.mass_regeneration:
+            details.append(_format_mass(self.mass_regeneration) + ' regen')
+        if not details:
+            return self.leads_to
+        return self.code + ' \u2192 ' + ', '.join([self.leads_to] + details)
+
+
+def _format_mass(kg):
+    return format(kg / 1000000, 'g') + 'kt'
+
+
+def _destination_class(leads_to):
+    match = _CLASS_NUMBER.match(leads_to)
+    if match:
+        return int(match.group(1))
+    return _DESTINATION_CLASSES.get(leads_to.split(' ', 1)[0].lower())
+
+
+def _optional_number(row, column, convert):
+    if column is None or column >= len(row) or row[column].strip() == '':
+        return None
+    return convert(row[column])
+
+
+# Yes I know there are many python libraries that read csv's better than this, and csv's are complicated to read
+# However this is a very simple csv, so there is no point dragging in extra dependencies for this
+# The first two columns are always WormholeType,LeadsTo. DestinationClass, MaxJumpMass, TotalMass, Lifetime and
+# MassRegeneration columns are all optional, and can be in any order after them
+def read_wormhole_types_csv(filepath):
+    wormhole_types = {}
+    with open(filepath) as f:
+        header = [name.strip() for name in next(f, '').split(',')]
+        columns = {name: i for i, name in enumerate(header)}
+        for line in f:
+            line = line.strip()
+            if line == '':
+                continue
+            row = line.split(',')
+            wh_name, leads_to = row[0], row[1]
+            destination_class = _optional_number(row, columns.get('DestinationClass'), int)
+            if destination_class is None:
+                destination_class = _destination_class(leads_to)
+            wormhole_types[wh_name] = WormholeType(wh_name, leads_to, destination_class,
+                                                   _optional_number(row, columns.get('MaxJumpMass'), float),
+                                                   _optional_number(row, columns.get('TotalMass'), float),
+                                                   _optional_number(row, columns.get('Lifetime'), float),
+                                                   _optional_number(row, columns.get('MassRegeneration'), float))
+    return wormhole_types
+
+
+# Loads the wormhole types from a pickled copy next to the csv, only reading the csv itself when it has changed since
+# the copy was made
+def load_wormhole_types(filepath, cache_path=None):
+    if cache_path is None:
+        cache_path = os.path.splitext(filepath)[0] + '.cache'
+    csv_mtime = os.path.getmtime(filepath)
+    try:
+        with open(cache_path, 'rb') as f:
+            version, mtime, wormhole_types = pickle.load(f)
+        if version == _CACHE_VERSION and mtime == csv_mtime:
+            return wormhole_types
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError, AttributeError):
+        pass
+    wormhole_types = read_wormhole_types_csv(filepath)
+    try:
+        atomic_write(cache_path, pickle.dumps((_CACHE_VERSION, csv_mtime, wormhole_types), pickle.HIGHEST_PROTOCOL),
+                     'wb')
+    except OSError as e:
+        print(e)
+        print('Unable to cache the wormhole types')
+    return wormhole_types
+
+
+class WormholeCodeMatcher(object):
+    """
+    Prefix trie of wormhole codes, fed one key press at a time from a single global keyboard hook. Rather than every
+    key press being checked against a separate hotkey for every wormhole type, we only track the trie nodes reached by
+    the last few keys. There can never be more of those than the length of the longest code, so the work per key press
+    stays the same no matter how many wormhole types there are.
+    """
+
+    def __init__(self, codes=None, timeout=1.0):
+        self.root = {}
+        # Seconds allowed between key presses of the same code, like the keyboard library's hotkey sequences. Timestamps
+        # are in time() seconds to match keyboard events
+        self.timeout = timeout
+        self._active_nodes = []
+        self._last_key_time = None
+        if codes is not None:
+            for code, value in codes.items():
+                self.add(code, value)
+
+    def add(self, code, value):
+        node = self.root
+        for char in code.lower():
+            node = node.setdefault(char, {})
+        node[_VALUE] = value
+
+    def remove(self, code):
+        # Walk down the trie remembering the path, so that branches only used by this code can be pruned
+        path = [self.root]
+        for char in code.lower():
+            node = path[-1].get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].pop(_VALUE, None)
+        for parent, char in zip(reversed(path[:-1]), reversed(code.lower())):
+            if parent[char]:
+                break
+            del parent[char]
+        self.reset()
+
+    def reset(self):
+        self._active_nodes = []
+        self._last_key_time = None
+
+    # Feeds a single character into the matcher. Returns the value of the code the key completed, or None
+    def feed(self, char, timestamp=None):
+        if timestamp is None:
+            timestamp = time()
+        if self._last_key_time is not None and timestamp - self._last_key_time > self.timeout:
+            self._active_nodes = []
+        self._last_key_time = timestamp
+
+        char = char.lower()
+        match = None
+        next_nodes = []
+        # Nodes are kept oldest first, so when codes overlap the longest one wins
+        for node in self._active_nodes + [self.root]:
+            child = node.get(char)
+            if child is None:
+                continue
+            if match is None and _VALUE in child:
+                match = child[_VALUE]
+            # Only keep nodes that longer codes can continue from
+            if len(child) > 1 or _VALUE not in child:
+                next_nodes.append(child)
+
+        if match is not None:
+            self.reset()
+        else:
+            self._active_nodes = next_nodes
+        return match
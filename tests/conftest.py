@@ -0,0 +1,208 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# pytest is MIT licenced
+import pytest
+# Python standard library is PSF licenced
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, sleep
+from urllib.parse import parse_qsl, urlencode
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+
+# The program's modules sit at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Default for FakeSSO.redirect's state, meaning the state the login was started with
+_LOGIN_STATE = object()
+
+
+class FakeSSO(object):
+    """
+    Stands in for the eve SSO, on a local http server of its own. redirect() is the browser being sent back to our
+    callback server on callback_port once the user has logged in. The server answers token requests at token_url,
+    handing out a new access token (and a new refresh token too if rotate is set) for every refresh, each taking
+    token_delay seconds. resource_url is a character's location, which only answers to the latest access token (and
+    401s anything else) after resource_delay seconds.
+    """
+
+    def __init__(self, callback_port=None, state='state-from-the-handler', rotate=False, token_delay=0,
+                 resource_delay=0):
+        self.callback_port = callback_port
+        self.state = state
+        self.rotate = rotate
+        self.token_delay = token_delay
+        self.resource_delay = resource_delay
+        self.token_requests = 0
+        self.resource_requests = 0
+        self.access_token = 'access-0'
+        self.refresh_token = 'refresh-0'
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('localhost', 0), _FakeSSORequestHandler)
+        self._server.daemon_threads = True
+        self._server.sso = self
+        self.url = 'http://localhost:' + str(self._server.server_address[1])
+        self.token_url = self.url + '/oauth/token'
+        self.resource_url = self.url + '/characters/90000001/location/'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    # Returns the http status the callback server answered with. state=None leaves the state out altogether
+    def redirect(self, code=None, state=_LOGIN_STATE):
+        query = {}
+        if code is not None:
+            query['code'] = code
+        if state is _LOGIN_STATE:
+            state = self.state
+        if state is not None:
+            query['state'] = state
+        connection = http.client.HTTPConnection('localhost', self.callback_port, timeout=5)
+        try:
+            connection.request('GET', '/?' + urlencode(query))
+            return connection.getresponse().status
+        finally:
+            connection.close()
+
+    def _issue_tokens(self, form):
+        sleep(self.token_delay)
+        with self._lock:
+            if form.get('grant_type') == 'refresh_token' and form.get('refresh_token') != self.refresh_token:
+                return 400, {'error': 'invalid_grant'}
+            self.token_requests += 1
+            self.access_token = 'access-' + str(self.token_requests)
+            tokens = {'access_token': self.access_token, 'expires_in': 1200}
+            if self.rotate:
+                self.refresh_token = 'refresh-' + str(self.token_requests)
+                tokens['refresh_token'] = self.refresh_token
+            return 200, tokens
+
+    def _resource(self, authorization):
+        sleep(self.resource_delay)
+        with self._lock:
+            self.resource_requests += 1
+            if authorization != 'Bearer ' + self.access_token:
+                return 401, {'message': 'Authentication needed, bad token'}
+        return 200, {'solarSystem': {'name': 'J100001'}}
+
+
+class _FakeSSORequestHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        path, _, query = self.path.partition('?')
+        form = dict(parse_qsl(query))
+        if path == '/oauth/token':
+            self._reply(*self.server.sso._issue_tokens(form))
+        else:
+            self._reply(404, {})
+
+    def do_GET(self):
+        if self.path == '/characters/90000001/location/':
+            self._reply(*self.server.sso._resource(self.headers.get('Authorization')))
+        else:
+            self._reply(404, {})
+
+    def _reply(self, status, document):
+        body = json.dumps(document).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# Signals emitted on other threads reach the test through the Qt event loop
+@pytest.fixture(scope='session')
+def app():
+    pytest.importorskip('PyQt5')
+    from PyQt5.QtCore import QCoreApplication
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+# Processes Qt events until condition() is true, returning False if it still isn't after timeout seconds
+@pytest.fixture
+def wait_until(app):
+    def wait(condition, timeout=5):
+        deadline = monotonic() + timeout
+        while not condition():
+            if monotonic() > deadline:
+                return False
+            app.processEvents()
+            sleep(0.01)
+        return True
+    return wait
+
+
+@pytest.fixture
+def port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def fake_sso(port):
+    sso = FakeSSO(port)
+    yield sso
+    sso.stop()
+
+
+@pytest.fixture
+def crest_handler(app, tmp_path):
+    pytest.importorskip('requests')
+    from PyQt5.QtCore import Qt
+    from EveCRESTHandler import EveCRESTHandler
+    handler = EveCRESTHandler(endpoint_cache_path=str(tmp_path / 'endpoint_cache.json'))
+    handler.saved_tokens = []
+    # Direct, so tests can see which thread the token is saved from
+    handler.new_refresh_token.connect(
+        lambda token: handler.saved_tokens.append((token, threading.current_thread())), Qt.DirectConnection)
+    yield handler
+    handler.poll_executor.shutdown()
+    handler.worker_thread.quit()
+    handler.worker_thread.wait()
+
+
+# Adds a logged in character to crest_handler, with its location at the fake_sso's resource_url. Unless expired is
+# False, its access token has expired
+@pytest.fixture
+def add_session(crest_handler, fake_sso):
+    from EveCRESTHandler import CharacterSession
+
+    def add(name='Pilot', expired=True):
+        session = CharacterSession(crest_handler.session, 'client id', 'secret', fake_sso.refresh_token)
+        session.token_manager.token_url = fake_sso.token_url
+        session.token_manager.access_token = 'expired' if expired else fake_sso.access_token
+        session.end_points = {'char': 'https://crest-tq.eveonline.com/characters/90000001/',
+                              'location': fake_sso.resource_url}
+        session.name = name
+        crest_handler.sessions.append(session)
+        return session
+    return add
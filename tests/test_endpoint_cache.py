@@ -0,0 +1,75 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# pytest is MIT licenced
+import pytest
+# Python standard library is PSF licenced
+import json
+
+pytest.importorskip('requests')
+pytest.importorskip('PyQt5')
+
+# Other files from this project, GPL v3 licenced
+from EveCRESTHandler import EndpointCache
+
+CHAR = 'https://crest-tq.eveonline.com/characters/90000001/'
+LOCATION = CHAR + 'location/'
+
+
+def test_character_is_found_by_its_rotated_token_on_the_next_launch(tmp_path):
+    path = str(tmp_path / 'endpoint_cache.json')
+    cache = EndpointCache(path)
+    cache.set_character('first-token', CHAR, LOCATION, 'Pilot')
+    # The SSO handed out a new refresh token when the first one was used
+    cache.set_character('second-token', CHAR, LOCATION, 'Pilot')
+
+    next_launch = EndpointCache(path)
+    assert next_launch.get_character('second-token')['location'] == LOCATION
+    assert next_launch.get_character('first-token') is None
+    with open(path) as f:
+        data = json.load(f)
+    assert list(data['characters']) == [CHAR]
+    assert list(data['tokens'].values()) == [CHAR]
+
+
+def test_old_entries_are_pruned(tmp_path):
+    path = str(tmp_path / 'endpoint_cache.json')
+    cache = EndpointCache(path, max_age=60)
+    cache.set_character('token', CHAR, LOCATION, 'Pilot')
+    cache.set_public({'decode': {'href': 'decode'}})
+    with open(path) as f:
+        data = json.load(f)
+    data['characters'][CHAR]['time'] -= 120
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+    next_launch = EndpointCache(path, max_age=60)
+    assert next_launch.get_character('token') is None
+    assert next_launch.get_public() is not None
+    next_launch.save()
+    with open(path) as f:
+        data = json.load(f)
+    assert data['characters'] == {} and data['tokens'] == {}
+
+
+def test_cache_from_before_the_token_index_is_ignored(tmp_path):
+    path = str(tmp_path / 'endpoint_cache.json')
+    with open(path, 'w') as f:
+        json.dump({'public': None, 'characters': {'abc': {'time': 0, 'char': CHAR, 'location': LOCATION}}}, f)
+    assert EndpointCache(path).get_character('token') is None
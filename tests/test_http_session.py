@@ -0,0 +1,85 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# pytest is MIT licenced
+import pytest
+# Python standard library is PSF licenced
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+import threading
+
+pytest.importorskip('requests')
+
+# Other files from this project, GPL v3 licenced
+from HttpSession import PooledSession
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super(_KeepAliveHandler, self).setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        sleep(self.server.delay)
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('localhost', 0), _KeepAliveHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.delay = 0
+    server.url = 'http://localhost:' + str(server.server_address[1]) + '/'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_connection_is_reused(stub_server):
+    session = PooledSession()
+    for _ in range(5):
+        session.get(stub_server.url).raise_for_status()
+    assert stub_server.connections == 1
+    assert session.get_connection_stats() == {'requests': 5, 'connections': 1, 'reused': 4}
+
+
+def test_requests_beyond_the_pool_dont_wait(stub_server):
+    stub_server.delay = 0.5
+    session = PooledSession(max_per_host=1, timeout=5)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        responses = list(executor.map(lambda _: session.get(stub_server.url), range(3)))
+    assert all(response.ok for response in responses)
+    assert stub_server.connections == 3
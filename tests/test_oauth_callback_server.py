@@ -0,0 +1,117 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Drives the SSO callback server the way the browser does at the end of a login, with the FakeSSO from conftest.py
+# standing in for login.eveonline.com. Run with python -m pytest tests
+
+# pytest is MIT licenced
+import pytest
+# Python standard library is PSF licenced
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+import socket
+
+pytest.importorskip('requests')
+pytest.importorskip('PyQt5')
+
+# Other files from this project, GPL v3 licenced
+from EveCRESTHandler import OAuthCallbackServer
+
+
+@pytest.fixture
+def server(app, port, fake_sso):
+    callback_server = OAuthCallbackServer(port, fake_sso.state, idle_timeout=30)
+    callback_server.codes = []
+    callback_server.auth_code_received.connect(callback_server.codes.append)
+    callback_server.start()
+    yield callback_server
+    callback_server.stop()
+
+
+def test_only_the_first_good_redirect_is_passed_on(wait_until, server, fake_sso):
+    good_codes = ['code-' + str(i) for i in range(10)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        # Every good redirect twice, as if the page had been refreshed, mixed in with ones that should be refused
+        good = [executor.submit(fake_sso.redirect, code) for code in good_codes + good_codes]
+        bad = ([executor.submit(fake_sso.redirect, 'forged-' + str(i), 'wrong-state') for i in range(5)] +
+               [executor.submit(fake_sso.redirect, None) for _ in range(5)] +
+               [executor.submit(fake_sso.redirect, 'no-state', None) for _ in range(5)])
+        assert [future.result() for future in good] == [200] * len(good)
+        assert [future.result() for future in bad] == [400] * len(bad)
+
+    assert wait_until(lambda: server.codes)
+    wait_until(lambda: False, timeout=0.2)
+    assert len(server.codes) == 1
+    assert server.codes[0] in good_codes
+
+
+def test_wrong_state_is_refused(wait_until, server, fake_sso):
+    assert fake_sso.redirect('forged', 'wrong-state') == 400
+    assert fake_sso.redirect('forged', None) == 400
+    wait_until(lambda: False, timeout=0.2)
+    assert server.codes == []
+    # A good login still gets through afterwards
+    assert fake_sso.redirect('real') == 200
+    assert wait_until(lambda: server.codes == ['real'])
+
+
+def test_idle_timeout_then_stop_frees_the_port(wait_until, port, fake_sso):
+    callback_server = OAuthCallbackServer(port, fake_sso.state, idle_timeout=0.2)
+    timeouts = []
+    callback_server.timed_out.connect(lambda: timeouts.append(True))
+    callback_server.start()
+    thread = callback_server._thread
+    assert wait_until(lambda: timeouts)
+
+    started_stopping = monotonic()
+    callback_server.stop()
+    assert monotonic() - started_stopping < 1
+    assert not thread.is_alive()
+    assert_port_is_free(wait_until, port, fake_sso)
+
+
+def test_stop_with_a_connection_still_open_frees_the_port(wait_until, port, fake_sso):
+    callback_server = OAuthCallbackServer(port, fake_sso.state, idle_timeout=30)
+    callback_server.start()
+    thread = callback_server._thread
+    # A browser that connected but hasn't sent its request yet
+    idle_client = socket.create_connection(('localhost', port))
+    try:
+        sleep(0.1)
+        started_stopping = monotonic()
+        callback_server.stop()
+        assert monotonic() - started_stopping < 1
+        assert not thread.is_alive()
+    finally:
+        idle_client.close()
+    assert_port_is_free(wait_until, port, fake_sso)
+
+
+# A new server for the next login can listen on the same port and receive a code
+def assert_port_is_free(wait_until, port, fake_sso):
+    next_server = OAuthCallbackServer(port, fake_sso.state, idle_timeout=30)
+    codes = []
+    next_server.auth_code_received.connect(codes.append)
+    next_server.start()
+    try:
+        assert next_server._thread.is_alive()
+        assert fake_sso.redirect('next-login') == 200
+        assert wait_until(lambda: codes == ['next-login'])
+    finally:
+        next_server.stop()
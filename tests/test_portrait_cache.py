@@ -0,0 +1,89 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# pytest is MIT licenced
+import pytest
+
+requests = pytest.importorskip('requests')
+pytest.importorskip('PyQt5')
+
+# Other files from this project, GPL v3 licenced
+from EveCRESTHandler import PortraitCache, is_complete_image
+
+URL = 'https://imageserver.eveonline.com/Character/90000001_128.jpg'
+JPEG = b'\xff\xd8\xff\xe0' + b'portrait' * 16 + b'\xff\xd9'
+
+
+class ImageServer(object):
+    """
+    Serves one image with an ETag, answering 304 to requests that already have it, and remembers the headers it was
+    asked with.
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self.requests = []
+
+    def get(self, url, headers=None):
+        headers = headers or {}
+        self.requests.append(headers)
+        response = requests.models.Response()
+        response.url = url
+        response.headers['ETag'] = '"v1"'
+        if headers.get('If-None-Match') == '"v1"':
+            response.status_code = 304
+            response._content = b''
+        else:
+            response.status_code = 200
+            response._content = self.image
+        return response
+
+
+def test_complete_images_are_recognised():
+    assert is_complete_image(JPEG)
+    assert not is_complete_image(JPEG[:-10])
+    assert is_complete_image(b'\x89PNG\r\n\x1a\n' + b'chunks' + b'\x00\x00\x00\x00IEND\xaeB`\x82')
+    assert not is_complete_image(b'\x89PNG\r\n\x1a\n' + b'chunks')
+    assert not is_complete_image(b'<html>Service unavailable</html>')
+
+
+def test_cached_portrait_is_revalidated(tmp_path):
+    server = ImageServer(JPEG)
+    cache = PortraitCache(str(tmp_path))
+    assert cache.fetch(server, URL, 90000001, '128x128') == JPEG
+    assert cache.fetch(server, URL, 90000001, '128x128') == JPEG
+    assert server.requests[-1].get('If-None-Match') == '"v1"'
+
+
+def test_damaged_cached_portrait_is_downloaded_again(tmp_path):
+    server = ImageServer(JPEG)
+    cache = PortraitCache(str(tmp_path))
+    cache.fetch(server, URL, 90000001, '128x128')
+    image_path = tmp_path / '90000001_128x128.img'
+    image_path.write_bytes(JPEG[:20])
+
+    assert cache.fetch(server, URL, 90000001, '128x128') == JPEG
+    assert 'If-None-Match' not in server.requests[-1]
+    assert image_path.read_bytes() == JPEG
+
+
+def test_damaged_download_isnt_cached(tmp_path):
+    cache = PortraitCache(str(tmp_path))
+    cache.fetch(ImageServer(JPEG[:20]), URL, 90000001, '128x128')
+    assert list(tmp_path.iterdir()) == []
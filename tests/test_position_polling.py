@@ -0,0 +1,69 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Location polls run on the polling threads without holding up the handler's own thread, with the FakeSSO from
+# conftest.py answering them
+
+# pytest is MIT licenced
+import pytest
+# Python standard library is PSF licenced
+from time import monotonic
+import threading
+
+pytest.importorskip('requests')
+pytest.importorskip('PyQt5')
+
+# PyQt is GPL v3
+from PyQt5.QtCore import Qt
+
+
+def test_slow_polls_dont_hold_up_the_handler(crest_handler, fake_sso, add_session, wait_until):
+    fake_sso.resource_delay = 1
+    locations = []
+    statuses = []
+    crest_handler.character_location_changed.connect(
+        lambda name, position: locations.append((name, position)), Qt.DirectConnection)
+    crest_handler.status_updated.connect(lambda status: statuses.append(threading.current_thread()),
+                                         Qt.DirectConnection)
+    add_session('Pilot', expired=False)
+    add_session('Scout', expired=False)
+    for session in crest_handler.sessions:
+        session.next_poll = monotonic()
+
+    started = monotonic()
+    crest_handler._handle_position_update()
+    assert monotonic() - started < 0.5
+    # Polls still in flight aren't started again on the next tick
+    crest_handler._handle_position_update()
+
+    assert wait_until(lambda: len(locations) == 2)
+    # Both characters were polled at the same time
+    assert monotonic() - started < 1.8
+    assert sorted(locations) == [('Pilot', 'J100001'), ('Scout', 'J100001')]
+    assert fake_sso.resource_requests == 2
+    assert all(not session.polling for session in crest_handler.sessions)
+    assert all(not thread.name.startswith('ThreadPoolExecutor') for thread in statuses)
+
+
+def test_positions_of_unnamed_characters_are_kept_apart(crest_handler, add_session):
+    first = add_session(None)
+    second = add_session(None)
+    first.position = 'Jita'
+    second.position = 'Amarr'
+    assert list(crest_handler.get_character_positions().values()) == [(None, 'Jita'), (None, 'Amarr')]
@@ -0,0 +1,71 @@
+"""
+    EveExploHelper - a small program to help explorers of New Eden (Eve Online)
+    Copyright 2017 apocolypse600
+
+    This file is part of EveExploHelper.
+
+    EveExploHelper is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License version 3 as published by
+    the Free Software Foundation.
+
+    EveExploHelper is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with EveExploHelper.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# A request turned down with a 401 refreshes the access token and is tried again, with the FakeSSO from conftest.py
+# handing out the tokens
+
+# pytest is MIT licenced
+import pytest
+# Python standard library is PSF licenced
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+pytest.importorskip('requests')
+pytest.importorskip('PyQt5')
+
+
+def test_401_refreshes_and_retries(crest_handler, fake_sso, add_session):
+    session = add_session()
+    response = crest_handler._authed_get(session, fake_sso.resource_url)
+    assert response.status_code == 200
+    assert response.json()['solarSystem']['name'] == 'J100001'
+    assert fake_sso.token_requests == 1
+    assert fake_sso.resource_requests == 2
+    assert session.token_manager.access_token == fake_sso.access_token
+    # The refresh token didn't change, so there's nothing to save
+    assert crest_handler.saved_tokens == []
+
+
+def test_rotated_refresh_token_is_saved_on_the_handler_thread(crest_handler, fake_sso, add_session, wait_until):
+    fake_sso.rotate = True
+    session = add_session()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        polling_thread, response = executor.submit(
+            lambda: (threading.current_thread(), crest_handler._authed_get(session, fake_sso.resource_url))).result()
+    assert response.status_code == 200
+
+    assert wait_until(lambda: crest_handler.saved_tokens)
+    token, thread = crest_handler.saved_tokens[0]
+    assert token == 'refresh-1'
+    assert thread is not polling_thread
+    assert thread is not threading.main_thread()
+    assert crest_handler.endpoint_cache.get_character('refresh-1')['location'] == fake_sso.resource_url
+
+
+def test_requests_turned_down_together_share_one_refresh(crest_handler, fake_sso, add_session, wait_until):
+    # Each refresh uses up the refresh token, so a second refresh with the old one would be turned down
+    fake_sso.rotate = True
+    fake_sso.token_delay = 0.3
+    session = add_session()
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        responses = list(executor.map(lambda _: crest_handler._authed_get(session, fake_sso.resource_url), range(6)))
+    assert [response.status_code for response in responses] == [200] * 6
+    assert fake_sso.token_requests == 1
+    assert wait_until(lambda: crest_handler.saved_tokens)
+    assert {token for token, thread in crest_handler.saved_tokens} == {'refresh-1'}